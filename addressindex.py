@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+from tempfile import mkstemp
+
+
+SOURCE = "address.geojson"
+INDEX = "address.geojson.db"
+
+
+def _signature(fp):
+    stat = os.stat(fp)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def build(path):
+    """Crea el índice de direcciones por nombre de calle de un proceso.
+
+    Guarda cada elemento serializado junto a su calle para que una consulta
+    solo tenga que deserializar los elementos de esa calle.
+    """
+    src = os.path.join(path, SOURCE)
+    if not os.path.exists(src):
+        return False
+    signature = _signature(src)
+    with open(src, "r") as fo:
+        data = json.load(fo)
+    features = data.pop("features", [])
+    fd, tmp = mkstemp(dir=path, suffix=".tmp")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp)
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE features (street TEXT, feature TEXT)")
+        conn.executemany(
+            "INSERT INTO features VALUES (?, ?)",
+            (
+                (feat["properties"].get("TN_text"), json.dumps(feat))
+                for feat in features
+            ),
+        )
+        conn.execute("CREATE INDEX features_street ON features (street)")
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [("signature", signature), ("header", json.dumps(data))],
+        )
+        conn.commit()
+        conn.close()
+        os.replace(tmp, os.path.join(path, INDEX))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return True
+
+
+def _open(path):
+    """Abre el índice, reconstruyéndolo si no corresponde al origen."""
+    fp = os.path.join(path, INDEX)
+    signature = _signature(os.path.join(path, SOURCE))
+    for __ in range(2):
+        if os.path.exists(fp):
+            conn = sqlite3.connect(fp)
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = 'signature'"
+            ).fetchone()
+            if row and row[0] == signature:
+                return conn
+            conn.close()
+        build(path)
+    raise OSError(f"No se pudo crear el índice de direcciones en {path}")
+
+
+def lookup(path, street):
+    """Devuelve la colección de direcciones de una calle o None."""
+    if not os.path.exists(os.path.join(path, SOURCE)):
+        return None
+    conn = _open(path)
+    try:
+        header = conn.execute(
+            "SELECT value FROM meta WHERE key = 'header'"
+        ).fetchone()[0]
+        rows = conn.execute(
+            "SELECT feature FROM features WHERE street = ?", [street]
+        ).fetchall()
+    finally:
+        conn.close()
+    data = json.loads(header)
+    data["features"] = [json.loads(row[0]) for row in rows]
+    return data
+
+
+def remove(path):
+    fp = os.path.join(path, INDEX)
+    if os.path.exists(fp):
+        os.remove(fp)
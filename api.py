@@ -1,20 +1,38 @@
+import hashlib
 import json
 import logging
 import os
+import threading
+import time
+from datetime import datetime, timezone
 
-from flask import Flask, g, request, send_file
+import click
+from flask import Flask, Response, g, request, send_file
 from flask_cors import CORS
 from flask_restful import abort, Api, reqparse, Resource
 from flask_socketio import SocketIO, join_room, leave_room
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 
 from config import Config
 from catatom2osm import config as cat_config
+from catatom2osm.exceptions import CatValueError
 cat_config.get_user_config('catconfig.yaml')
 
-from catatom2osm import csvtools
-
 import auth
+import batches
+import boundarycache
+import datasets
+import exports
+import jobcatalog
+import jobindex
+import jobqueue
+import metrics
+import municipalities
+import rooms
 import schema
+from prewarm import Prewarmer
+from scheduler import Scheduler
+from socketqueue import SqliteManager
 from work import Work, check_owner
 
 
@@ -22,7 +40,30 @@ app = Flask(__name__, instance_relative_config=True)
 app.config.from_object(Config)
 origins = app.config["CLIENT_URL"]
 cors = CORS(app, resources={r"/*": {"origins": origins}}, supports_credentials=True)
-socketio = SocketIO(app, cors_allowed_origins=origins)
+message_queue = app.config["SOCKETIO_MESSAGE_QUEUE"]
+if message_queue == "sqlite":
+    socketio = SocketIO(
+        app, cors_allowed_origins=origins, client_manager=SqliteManager()
+    )
+else:
+    socketio = SocketIO(
+        app, cors_allowed_origins=origins, message_queue=message_queue or None
+    )
+room_state = rooms.SharedRooms() if message_queue else rooms.LocalRooms()
+prewarmer = Prewarmer(
+    socketio,
+    app.config["PREWARM_WORKERS"],
+    app.config["PREWARM_INTERVAL"],
+    app.config["PREWARM_TTL"],
+)
+scheduler = Scheduler(
+    socketio,
+    app.config["JOB_WORKERS"],
+    app.config["JOB_QUEUE_SIZE"],
+    app.config["JOB_WORKER_MAX_JOBS"],
+    app.config["JOB_WORKER_MAX_RSS"],
+    prewarmer,
+)
 api = Api(app)
 
 status_msg = {
@@ -44,6 +85,9 @@ status_msg = {
     Work.Status.ERROR: (
         502, "Terminó con error"
     ),
+    Work.Status.QUEUED: (
+        409, "En cola de proceso"
+    ),
 }
 
 APP_DIR = os.environ['HOME']
@@ -51,6 +95,138 @@ for fn in ['results', 'backup', 'cache']:
     p = os.path.join(APP_DIR, fn)
     if not os.path.exists(p):
         os.mkdir(p)
+if not jobindex.count():
+    jobindex.rebuild()
+if not jobcatalog.count():
+    for mun_code in jobindex.mun_codes():
+        Work.update_catalog(mun_code)
+municipalities.load()
+boundarycache.configure(Config.BOUNDARY_CACHE_TTL, Config.BOUNDARY_OFFLINE)
+datasets.configure(Config.DATASET_QUOTA, Config.DATASET_MAX_AGE)
+STARTED = time.time()
+
+
+def _queue_depth():
+    states = list(jobqueue.states().values())
+    return [
+        ({"state": state}, states.count(state)) for state in ("queued", "running")
+    ]
+
+
+def _cache_ratios():
+    boundary = boundarycache.counters
+    stats = datasets.stats()
+    data = {
+        "boundary": (boundary["hits"], boundary["misses"]),
+        "datasets": (stats["hits"], stats["misses"]),
+    }
+    return [
+        ({"cache": cache}, hits / (hits + misses) if hits + misses else None)
+        for cache, (hits, misses) in data.items()
+    ]
+
+
+metrics.register(
+    "catatom_queue_jobs", "Procesos en la cola por estado", "gauge", _queue_depth
+)
+metrics.register(
+    "catatom_room_participants",
+    "Clientes de Socket.IO conectados a cada sala",
+    "gauge",
+    lambda: [({"room": room}, n) for room, n in room_state.counts().items()],
+)
+metrics.register(
+    "catatom_cache_hit_ratio",
+    "Proporción de aciertos de las cachés de límites y descargas",
+    "gauge",
+    _cache_ratios,
+)
+metrics.register(
+    "catatom_socketio_connections",
+    "Clientes de Socket.IO conectados a este proceso",
+    "gauge",
+    lambda: [({}, len(socketio.server.eio.sockets))],
+)
+
+
+@app.cli.command("index")
+@click.argument("action", type=click.Choice(["rebuild", "verify"]))
+def index_command(action):
+    """Reconstruye o verifica el índice de estado de los procesos."""
+    if action == "rebuild":
+        click.echo(f"{jobindex.rebuild()} procesos indexados")
+        jobcatalog.clear()
+        for mun_code in jobindex.mun_codes():
+            Work.update_catalog(mun_code)
+    else:
+        errors = jobindex.verify()
+        for mun_code in errors:
+            click.echo(f"{mun_code}: el índice no coincide con el disco")
+        if errors:
+            raise SystemExit(1)
+        click.echo("Índice correcto")
+
+
+@app.cli.command("boundary")
+@click.argument("prov_code")
+@click.option("--districts", is_flag=True, help="Incluye distritos y barrios")
+def boundary_command(prov_code, districts):
+    """Carga en la caché los límites de los municipios de una provincia."""
+    if prov_code not in cat_config.prov_codes.keys():
+        raise click.BadParameter(f"Código de provincia '{prov_code}' no válido")
+    errors = boundarycache.prewarm(prov_code, districts)
+    for mun_code in errors:
+        click.echo(f"{mun_code}: no se pudieron obtener los límites")
+    stats = boundarycache.stats()
+    click.echo(f"{stats['entries']} entradas en la caché de límites")
+    if errors:
+        raise SystemExit(1)
+
+
+@app.cli.command("datasets")
+@click.argument("action", type=click.Choice(["import", "evict"]))
+@click.argument("path", required=False)
+def datasets_command(action, path):
+    """Importa descargas de una carpeta al almacén o aplica la cuota."""
+    if action == "import":
+        keys = datasets.import_dir(path or os.path.join(APP_DIR, "backup"))
+        click.echo(f"{len(keys)} descargas en el almacén")
+    else:
+        click.echo(f"{len(datasets.evict())} descargas eliminadas")
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    if "request_start" not in g:
+        return response
+    start = g.request_start
+    labels = dict(
+        resource=request.endpoint or "",
+        method=request.method,
+        status=response.status_code,
+    )
+
+    def observe():
+        metrics.observe(
+            "catatom_request_seconds", time.perf_counter() - start, **labels
+        )
+
+    # Las respuestas por partes (descargas) se miden hasta el último byte
+    if response.is_streamed:
+        response.call_on_close(observe)
+    else:
+        observe()
+    return response
+
+
+@app.route("/metrics")
+def metrics_view():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route('/login')
@@ -86,44 +262,81 @@ class Provinces(Resource):
 class Province(Resource):
     def get(self, prov_code):
         """Devuelve lista de municipios"""
-        fn = os.path.join(cat_config.app_path, "municipalities.csv")
         if prov_code not in cat_config.prov_codes.keys():
             msg = _("Province code '%s' is not valid") % prov_code
             abort(404, message=msg)
         office = cat_config.prov_codes[prov_code]
-        municipalities = [
+        muns = [
             {
-                "cod_municipio": mun[0],
-                "nombre": mun[2],
-                "estado": Work(mun[0]).status.name,
+                "cod_municipio": mun_code,
+                "nombre": name,
+                "estado": Work.get_status(mun_code).name,
             }
-            for mun in csvtools.startswith(fn, prov_code)
+            for mun_code, name in municipalities.by_province(prov_code)
         ]
-        return {
+        data = {
             "cod_provincia": prov_code,
             "nombre": office, 
-            "municipios": municipalities,
+            "municipios": muns,
         }
+        resp = api.make_response(data, 200)
+        resp.set_etag(hashlib.sha1(resp.get_data()).hexdigest())
+        # El estado de los municipios depende también de la cola
+        updated = max(
+            jobindex.last_modified(prov_code), jobqueue.last_modified(prov_code)
+        ) or STARTED
+        resp.last_modified = datetime.fromtimestamp(updated, timezone.utc)
+        return resp.make_conditional(request)
 
 
 class Municipality(Resource):
     def get(self, mun_code):
         """Devuelve lista de distritos/barrios"""
         job = Work.validate(mun_code)
-        return job.splits
+        try:
+            return job.splits
+        except CatValueError as e:
+            abort(503, message=str(e))
+
+
+class BoundaryCache(Resource):
+    def get(self):
+        """Estadísticas de la caché de límites"""
+        return boundarycache.stats()
+
+
+class DatasetStore(Resource):
+    def get(self):
+        """Estadísticas del almacén de descargas del Catastro"""
+        return datasets.stats()
+
+
+class InfoCache(Resource):
+    def get(self):
+        """Cobertura de la precarga de info.json y splits.json"""
+        return prewarmer.coverage()
 
 
 class Job(Resource):
     def __init__(self):
         self.parser = schema.JobSchema()
+        self.poll_parser = schema.JobPollSchema()
+        self.list_parser = schema.JobListSchema()
 
     def get(self, mun_code=None, split=None):
         """Estado del proceso de un municipio."""
         if not mun_code:
-            return Work.list_jobs()
-        args = self.parser.load(request.args)
+            args = self.list_parser.load(request.args)
+            total, data = Work.list_jobs(**args)
+            return data, 200, {"X-Total-Count": str(total)}
+        args = self.poll_parser.load(request.args)
+        versions = dict(
+            item.split(":", 1)
+            for item in args.pop("versiones", "").split(",")
+            if ":" in item
+        )
         job = Work.validate(mun_code, split, **args)
-        data = job.get_dict()
+        data = job.get_dict(versions=versions)
         data["mensaje"] = status_msg[job.status][1]
         return data
 
@@ -137,19 +350,21 @@ class Job(Resource):
         status = job.status
         if (
             (status == Work.Status.DONE and job.current_args == job.last_args)
-            or status in [Work.Status.FIXME, Work.Status.RUNNING]
+            or status in [
+                Work.Status.FIXME, Work.Status.RUNNING, Work.Status.QUEUED
+            ]
         ):
             msg = status_msg[status][1].format(mun_code)
             abort(status_msg[status][0], message=msg)
         try:
-            job.start()
-            data = dict(**g.user_data, room=mun_code)
-            socketio.emit("createJob", data, to=mun_code)
-            socketio.start_background_task(job.watch_log, g.user_data)
-        except Exception as e:
-            msg = e.message if getattr(e, "message", "") else str(e)
-            abort(500, message=msg)
-        return job.get_dict("Procesando...")
+            position = scheduler.submit(mun_code, split, g.user_data, args)
+        except jobqueue.QueueFull:
+            abort(503, message="Cola de procesos llena, inténtalo más tarde")
+        if position is None:
+            abort(409, message=status_msg[Work.Status.RUNNING][1])
+        data = dict(**g.user_data, room=mun_code)
+        socketio.emit("createJob", data, to=mun_code)
+        return job.get_dict(status_msg[Work.Status.QUEUED][1])
 
     @auth.auth.login_required
     @check_owner
@@ -158,7 +373,8 @@ class Job(Resource):
         __ = request.data  # https://github.com/pallets/flask/issues/4546
         args = self.parser.load(request.args)
         job = Work.validate(mun_code, split, **args)
-        job.delete()
+        if not jobqueue.cancel(mun_code):
+            job.delete()
         job = Work(mun_code)
         data = dict(**g.user_data, room=mun_code)
         data["job"] = job.get_dict("Proceso eliminado correctamente")
@@ -166,6 +382,66 @@ class Job(Resource):
         return data["job"]
 
 
+class Batch(Resource):
+    def __init__(self):
+        self.parser = schema.BatchSchema()
+
+    def get(self, batch_id=None):
+        """Progreso de los lotes de procesos o de uno de ellos."""
+        if batch_id is None:
+            return batches.list_batches()
+        data = batches.get(batch_id)
+        if data is None:
+            abort(404, message=f"No existe el lote {batch_id}")
+        return data
+
+    @auth.auth.login_required
+    def post(self):
+        """Procesa una provincia o una lista de municipios y divisiones."""
+        data = json.loads(request.data)
+        args = self.parser.load(data)
+        prov_code = args.pop("prov", None)
+        items = [
+            (item["cod_municipio"], item.get("cod_division") or None)
+            for item in args.pop("items", [])
+        ]
+        if prov_code:
+            if prov_code not in cat_config.prov_codes.keys():
+                msg = _("Province code '%s' is not valid") % prov_code
+                abort(404, message=msg)
+            items += [
+                (mun_code, None)
+                for mun_code, __ in municipalities.by_province(prov_code)
+            ]
+        if not items:
+            abort(400, message="Indica una provincia o una lista de municipios")
+        codes = set(municipalities.all_codes())
+        for mun_code, __ in items:
+            if mun_code not in codes:
+                abort(404, message=f"Municipio '{mun_code}' no válido")
+        batch_id = batches.create(g.user_data, items, args, prov_code)
+        # Los límites de los municipios se obtienen antes de que empiecen.
+        # Las consultas a Overpass bloquean, así que van en otro hilo
+        for prov in sorted({mun_code[:2] for mun_code, __ in items}):
+            threading.Thread(
+                target=boundarycache.prewarm, args=(prov,), daemon=True
+            ).start()
+        return batches.get(batch_id), 201
+
+    @auth.auth.login_required
+    def delete(self, batch_id):
+        """Cancela los procesos del lote que no han empezado."""
+        __ = request.data  # https://github.com/pallets/flask/issues/4546
+        user = batches.owner(batch_id)
+        if user is None:
+            abort(404, message=f"No existe el lote {batch_id}")
+        if user["osm_id"] != g.user_data["osm_id"]:
+            msg = f"Lote creado por {user['username']} ({user['osm_id']})"
+            abort(409, message=msg)
+        batches.cancel(batch_id)
+        return batches.get(batch_id)
+
+
 class Highway(Resource):
 
     def get(self, mun_code):
@@ -236,6 +512,18 @@ class Fixme(Resource):
         return job.get_dict(status_msg[Work.Status.DONE])
 
 
+class Chat(Resource):
+    def __init__(self):
+        self.parser = schema.ChatSchema()
+
+    def get(self, mun_code):
+        """Historial del chat de un municipio"""
+        args = self.parser.load(request.args)
+        job = Work.validate(mun_code)
+        messages, total = job.chat(**args)
+        return messages, 200, {"X-Total-Count": str(total)}
+
+
 class Export(Resource):
     def __init__(self):
         self.parser = schema.JobSchema()
@@ -244,9 +532,37 @@ class Export(Resource):
         """Exporta carpeta de tareas"""
         args = self.parser.load(request.args)
         job = Work.validate(mun_code, split, **args)
+        if Config.EXPORT_STREAM:
+            data = job.export_stream()
+            if data:
+                chunks, etag = data
+                resp = Response(chunks, mimetype="application/zip")
+                resp.headers["Content-Disposition"] = (
+                    f"attachment; filename={mun_code}.zip"
+                )
+                resp.set_etag(etag)
+                return resp.make_conditional(request)
+            abort(404, message="Proceso no encontrado")
         data = job.export()
         if data:
-            return send_file(data, download_name=mun_code + ".zip")
+            fo, etag = data
+            # Con un archivo abierto send_file no conoce el tamaño, que hace
+            # falta para Content-Length y las peticiones Range
+            size = os.fstat(fo.fileno()).st_size
+            resp = send_file(
+                fo,
+                download_name=mun_code + ".zip",
+                etag=etag,
+                conditional=False,
+            )
+            resp.content_length = size
+            try:
+                return resp.make_conditional(
+                    request, accept_ranges=True, complete_length=size
+                )
+            except RequestedRangeNotSatisfiable:
+                fo.close()
+                raise
         else:
             abort(404, message="Proceso no encontrado")
 
@@ -254,6 +570,9 @@ class Export(Resource):
 api.add_resource(Provinces, '/prov')
 api.add_resource(Province, '/prov/<string:prov_code>')
 api.add_resource(Municipality, '/mun/<string:mun_code>')
+api.add_resource(BoundaryCache, '/cache/boundary')
+api.add_resource(DatasetStore, '/cache/datasets')
+api.add_resource(InfoCache, '/cache/info')
 api.add_resource(
     Job,
     '/job',
@@ -262,7 +581,9 @@ api.add_resource(
     '/job/<string:mun_code>/',
     '/job/<string:mun_code>/<string:split>',
 )
+api.add_resource(Batch, '/batch', '/batch/<int:batch_id>')
 api.add_resource(Highway, '/hgw/<string:mun_code>')
+api.add_resource(Chat, '/chat/<string:mun_code>')
 api.add_resource(
     Fixme,
     '/fixme/<string:mun_code>',
@@ -283,42 +604,50 @@ def hello_world():
 @socketio.on("disconnect")
 def handle_disconnect():
     data = {"username": request.args["username"]}
-    for room in list(socketio.server.manager.rooms["/"].keys()):
-        users = socketio.server.manager.rooms["/"].get(room)
-        if room and len(room) == 5 and request.sid in users:
-            data["room"] = room
-            leave_room(room)
-            data["participants"] = len(users)
-            if len(users) > 0:
-                socketio.emit("leave", data, to=room)
+    for room in room_state.rooms(request.sid):
+        data["room"] = room
+        leave_room(room)
+        data["participants"] = room_state.left(request.sid, room)
+        if data["participants"] > 0:
+            socketio.emit("leave", data, to=room)
 
 @socketio.on("chat")
 def handle_send(data):
     room = data["room"]
     job = Work.validate(room)
-    job.add_message(data)
+    data = job.add_message(data)
     socketio.emit("chat", data, to=room)
 
+@socketio.on("backfill")
+def on_backfill(data):
+    """Mensajes del chat desde el número data["id"], para reconectar."""
+    job = Work.validate(data["room"])
+    limit = min(int(data.get("limit", 500)), 500)
+    messages, total = job.chat(int(data.get("id", 0)), limit)
+    return {"room": data["room"], "charla": messages, "total": total}
+
 @socketio.on("join")
 def on_join(data):
     room = data["room"]
     join_room(room)
-    users = socketio.server.manager.rooms["/"].get(room, [])
-    data["participants"] = len(users)
+    data["participants"] = room_state.joined(request.sid, room)
     socketio.emit("join", data, to=room)
     return data
 
 @socketio.on('leave')
 def on_leave(data):
     room = data["room"]
-    users = socketio.server.manager.rooms["/"].get(room, [])
     leave_room(room)
-    data["participants"] = len(users)
-    if len(users) > 0:
+    data["participants"] = room_state.left(request.sid, room)
+    if data["participants"] > 0:
         socketio.emit("leave", data, to=room)
     return data
 
 
 if __name__ == '__main__':
     flask_port = os.environ["FLASK_PORT"]
+    if message_queue:
+        room_state.recover()
+    scheduler.start()
+    socketio.start_background_task(exports.sweeper, socketio)
     socketio.run(app, "0.0.0.0", flask_port, log_output=True)
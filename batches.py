@@ -0,0 +1,252 @@
+import json
+import time
+
+import db
+import jobqueue
+from work import Work
+
+
+PRIORITY = 1  # Detrás de los procesos encolados desde la web
+ACTIVE = {"PENDING", "QUEUED", "RUNNING"}
+
+
+def _table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user TEXT NOT NULL,
+            prov_code TEXT,
+            params TEXT NOT NULL DEFAULT '{}',
+            created REAL NOT NULL,
+            cancelled INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS batch_items (
+            batch_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            mun_code TEXT NOT NULL,
+            split TEXT,
+            state TEXT NOT NULL DEFAULT 'pending',
+            message TEXT,
+            PRIMARY KEY (batch_id, position)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS batch_items_state ON batch_items (state)"
+    )
+
+
+def _connect():
+    return db.connect(_table)
+
+
+def create(user, items, args, prov_code=None):
+    """Crea un lote con los elementos [(mun_code, split),...] y devuelve su id."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.execute(
+            "INSERT INTO batches (user, prov_code, params, created) "
+            "VALUES (?, ?, ?, ?)",
+            [json.dumps(user), prov_code, json.dumps(args), time.time()],
+        )
+        batch_id = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO batch_items (batch_id, position, mun_code, split) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (batch_id, i, mun_code, split)
+                for i, (mun_code, split) in enumerate(items)
+            ],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return batch_id
+
+
+def _set(conn, row, state, message=None, current="pending"):
+    """Cambia el estado de un elemento si sigue en el estado current."""
+    cur = conn.execute(
+        "UPDATE batch_items SET state = ?, message = ? "
+        "WHERE batch_id = ? AND position = ? AND state = ?",
+        [state, message, row["batch_id"], row["position"], current],
+    )
+    return cur.rowcount > 0
+
+
+def _skip(mun_code, split, user, args):
+    """Motivo para no procesar un elemento, o None si se puede procesar."""
+    owner = Work.get_user(mun_code)
+    if owner and owner["osm_id"] != user["osm_id"]:
+        return f"Proceso bloqueado por {owner['username']} ({owner['osm_id']})"
+    job = Work(mun_code, split, user, **args)
+    status = job.status
+    if status == Work.Status.DONE and job.current_args == job.last_args:
+        return "Proceso finalizado"
+    if status == Work.Status.FIXME:
+        return "Pendiente de revisar problemas"
+    if status == Work.Status.REVIEW:
+        return "Pendiente de revisar direcciones"
+    return None
+
+
+def feed(limit):
+    """Pasa a la cola de procesos los siguientes elementos pendientes.
+
+    Deja como mucho limit elementos de lotes esperando en la cola, así que
+    los procesos encolados desde la web no encuentran la cola llena y pasan
+    delante. Los municipios que ya están en cola se reintentan después.
+    Devuelve los elementos encolados.
+    """
+    free = limit - jobqueue.waiting(PRIORITY)
+    if free <= 0:
+        return []
+    conn = _connect()
+    rows = conn.execute(
+        "SELECT i.*, b.user, b.params FROM batch_items i "
+        "JOIN batches b ON b.id = i.batch_id "
+        "WHERE i.state = 'pending' ORDER BY i.batch_id, i.position"
+    ).fetchall()
+    busy = jobqueue.states()
+    fed = []
+    for row in rows:
+        if len(fed) >= free:
+            break
+        mun_code, split = row["mun_code"], row["split"]
+        if mun_code in busy:
+            continue
+        user = json.loads(row["user"])
+        args = json.loads(row["params"])
+        reason = _skip(mun_code, split, user, args)
+        if reason:
+            _set(conn, row, "skipped", reason)
+            continue
+        # Otro proceso de la API puede estar repartiendo el mismo lote
+        if not _set(conn, row, "queued"):
+            continue
+        params = {"user": user, "args": args, "batch": row["batch_id"]}
+        if jobqueue.push(mun_code, split, params, PRIORITY) is None:
+            _set(conn, row, "pending", current="queued")
+            continue
+        busy[mun_code] = "queued"
+        fed.append(dict(row, user=user))
+    return fed
+
+
+def finish(item):
+    """Guarda el estado final del elemento de lote de un trabajo terminado.
+
+    item es el trabajo de la cola tal como lo devuelve jobqueue.claim, ya
+    eliminado de la cola. No hace nada si no pertenece a un lote.
+    """
+    batch_id = item["params"].get("batch")
+    if batch_id is None:
+        return
+    status = Work.get_status(item["mun_code"], item["split"])
+    if status in (Work.Status.QUEUED, Work.Status.RUNNING):
+        # El proceso no llegó a terminar
+        status = Work.Status.ERROR
+    _connect().execute(
+        "UPDATE batch_items SET state = ? "
+        "WHERE batch_id = ? AND mun_code = ? AND IFNULL(split, '') = ? "
+        "AND state = 'queued'",
+        [status.name.lower(), batch_id, item["mun_code"], item["split"] or ""],
+    )
+
+
+def _status(row, queue):
+    if row["state"] != "queued":
+        return row["state"].upper()
+    if queue.get(row["mun_code"]) == "running":
+        return "RUNNING"
+    return Work.get_status(row["mun_code"], row["split"]).name
+
+
+def _summary(batch, items):
+    states = {}
+    for item in items:
+        states[item["estado"]] = states.get(item["estado"], 0) + 1
+    finished = len(items) - sum(states.get(state, 0) for state in ACTIVE)
+    return {
+        "id": batch["id"],
+        "cod_provincia": batch["prov_code"],
+        "propietario": {
+            k: v for k, v in json.loads(batch["user"]).items()
+            if k in ("osm_id", "username")
+        },
+        "creado": batch["created"],
+        "cancelado": bool(batch["cancelled"]),
+        "total": len(items),
+        "terminados": finished,
+        "progreso": finished / len(items) if items else 1,
+        "estados": states,
+    }
+
+
+def _items(conn, batch_id, queue):
+    rows = conn.execute(
+        "SELECT * FROM batch_items WHERE batch_id = ? ORDER BY position",
+        [batch_id],
+    )
+    return [
+        {
+            "cod_municipio": row["mun_code"],
+            "cod_division": row["split"] or "",
+            "estado": _status(row, queue),
+            "mensaje": row["message"] or "",
+        }
+        for row in rows
+    ]
+
+
+def get(batch_id):
+    """Progreso de un lote y estado de cada elemento, o None si no existe."""
+    conn = _connect()
+    batch = conn.execute("SELECT * FROM batches WHERE id = ?", [batch_id]).fetchone()
+    if batch is None:
+        return None
+    items = _items(conn, batch_id, jobqueue.states())
+    return dict(_summary(batch, items), elementos=items)
+
+
+def list_batches():
+    """Progreso de todos los lotes, los más recientes primero."""
+    conn = _connect()
+    queue = jobqueue.states()
+    return [
+        _summary(batch, _items(conn, batch["id"], queue))
+        for batch in conn.execute("SELECT * FROM batches ORDER BY id DESC")
+    ]
+
+
+def owner(batch_id):
+    row = _connect().execute(
+        "SELECT user FROM batches WHERE id = ?", [batch_id]
+    ).fetchone()
+    return json.loads(row["user"]) if row else None
+
+
+def cancel(batch_id):
+    """Cancela los elementos que aún no se han empezado a procesar."""
+    conn = _connect()
+    conn.execute("UPDATE batches SET cancelled = 1 WHERE id = ?", [batch_id])
+    conn.execute(
+        "UPDATE batch_items SET state = 'cancelled' "
+        "WHERE batch_id = ? AND state = 'pending'",
+        [batch_id],
+    )
+    rows = conn.execute(
+        "SELECT * FROM batch_items WHERE batch_id = ? AND state = 'queued'",
+        [batch_id],
+    ).fetchall()
+    for row in rows:
+        params = jobqueue.params(row["mun_code"]) or {}
+        if params.get("batch") == batch_id and jobqueue.cancel(row["mun_code"]):
+            _set(conn, row, "cancelled", current="queued")
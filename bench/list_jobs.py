@@ -0,0 +1,80 @@
+"""Tiempo de GET /job (Work.list_jobs) según el número de procesos.
+
+Crea N procesos terminados en una carpeta temporal y mide la primera
+página de 50 y la lista completa. Uso: python bench/list_jobs.py [N ...]
+"""
+import inspect
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Los módulos de la API leen HOME al importarse
+os.environ["HOME"] = tempfile.mkdtemp(prefix="catatom-bench-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from work import WORK_DIR, Work  # noqa: E402
+
+REPEAT = 5
+SIZES = [int(n) for n in sys.argv[1:]] or [100, 1000, 5000]
+
+
+def create(start, end):
+    """Crea los procesos start..end-1 como terminados."""
+    mun_codes = []
+    for i in range(start, end):
+        mun_code = f"9{i:04d}"
+        path = os.path.join(WORK_DIR, mun_code)
+        os.makedirs(os.path.join(path, "tasks"))
+        with open(os.path.join(path, "user.json"), "w") as fo:
+            json.dump({"osm_id": "1", "username": f"user{i % 20}"}, fo)
+        with open(os.path.join(path, "report.json"), "w") as fo:
+            json.dump({"tasks": 10, "out_parts": 100, "out_address": 50}, fo)
+        with open(os.path.join(path, "report.txt"), "w") as fo:
+            fo.write("Informe\n")
+        mun_codes.append(mun_code)
+    try:
+        import boundarycache
+        import jobindex
+    except ImportError:  # Versión sin índice ni catálogo
+        return
+    conn = boundarycache._connect()
+    for mun_code in mun_codes:
+        conn.execute(
+            "INSERT OR REPLACE INTO boundary_cache VALUES (?, ?, ?, ?)",
+            ["municipality", mun_code, json.dumps([1, mun_code]), time.time()],
+        )
+        jobindex.refresh(mun_code)
+        Work.update_catalog(mun_code)
+
+
+def measure(call):
+    best = float("inf")
+    for __ in range(REPEAT):
+        start = time.perf_counter()
+        data = call()
+        best = min(best, time.perf_counter() - start)
+    return best, len(json.dumps(data))
+
+
+def main():
+    paginated = "kwargs" in inspect.signature(Work.list_jobs).parameters
+    created = 0
+    print("procesos  página de 50          lista completa")
+    for size in SIZES:
+        create(created, size)
+        created = size
+        if paginated:
+            page = measure(lambda: Work.list_jobs(limit=50)[1])
+            full = measure(lambda: Work.list_jobs()[1])
+        else:
+            page = full = measure(Work.list_jobs)
+        print(
+            f"{size:8d}  {page[0] * 1000:8.1f} ms {page[1]:8d} B"
+            f"  {full[0] * 1000:8.1f} ms {full[1]:8d} B"
+        )
+
+
+if __name__ == "__main__":
+    main()
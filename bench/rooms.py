@@ -0,0 +1,108 @@
+"""Tiempo de una reconexión masiva de clientes (handle_disconnect y join).
+
+Conecta N clientes a salas de ROOMS municipios con el gestor de Socket.IO
+y mide cuánto tarda en desconectarse y volver a entrar cada uno, como
+tras un despliegue. Compara recorrer todas las salas del espacio de
+nombres, como hacía handle_disconnect, con rooms.LocalRooms (un proceso)
+y rooms.SharedRooms (varios procesos). Solo se mide el estado de las salas:
+el coste del propio gestor de Socket.IO es el mismo en los tres casos.
+Uso: python bench/rooms.py [N ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import socketio
+
+# Los módulos de la API leen HOME al importarse
+os.environ["HOME"] = tempfile.mkdtemp(prefix="catatom-bench-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rooms  # noqa: E402
+
+ROOMS = 2000
+SIZES = [int(n) for n in sys.argv[1:]] or [1000, 5000]
+
+
+def is_job_room(room):
+    # Las salas de municipio tienen el código de 5 dígitos; el resto son
+    # las salas privadas de cada cliente
+    return bool(room) and len(room) == 5
+
+
+class NamespaceRooms:
+    """Salas de un cliente recorriendo todas las del gestor de Socket.IO."""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def joined(self, sid, room):
+        return len(self.manager.rooms["/"].get(room, {}))
+
+    left = joined
+
+    def rooms(self, sid):
+        return [
+            room
+            for room, users in list(self.manager.rooms["/"].items())
+            if is_job_room(room) and sid in users
+        ]
+
+
+def connect(manager, state, eio_sid, room):
+    """Lo que hace on_join. Devuelve el sid y la duración de state."""
+    sid = manager.connect(eio_sid, "/")
+    manager.enter_room(sid, "/", room)
+    start = time.perf_counter()
+    state.joined(sid, room)
+    return sid, time.perf_counter() - start
+
+
+def disconnect(manager, state, sid):
+    """Lo que hace handle_disconnect. Devuelve la duración de state."""
+    elapsed = 0
+    start = time.perf_counter()
+    for room in state.rooms(sid):
+        elapsed += time.perf_counter() - start
+        manager.leave_room(sid, "/", room)
+        start = time.perf_counter()
+        state.left(sid, room)
+    elapsed += time.perf_counter() - start
+    manager.disconnect(sid, "/")
+    return elapsed
+
+
+def measure(size, make_state):
+    manager = socketio.Server(async_mode="threading").manager
+    manager.initialize()
+    state = make_state(manager)
+    rnd = random.Random(size)
+    clients = [(f"eio-{i}", f"{rnd.randrange(ROOMS):05d}") for i in range(size)]
+    sids = [connect(manager, state, eio, room)[0] for eio, room in clients]
+    elapsed = sum(disconnect(manager, state, sid) for sid in sids)
+    sids = []
+    for eio, room in clients:
+        sid, seconds = connect(manager, state, eio, room)
+        sids.append(sid)
+        elapsed += seconds
+    for sid in sids:
+        disconnect(manager, state, sid)
+    return elapsed
+
+
+def main():
+    print("clientes  recorrer salas  LocalRooms  SharedRooms")
+    for size in SIZES:
+        walk = measure(size, NamespaceRooms)
+        local = measure(size, lambda manager: rooms.LocalRooms())
+        shared = measure(size, lambda manager: rooms.SharedRooms())
+        print(
+            f"{size:8d}  {walk * 1000:11.1f} ms  {local * 1000:7.1f} ms"
+            f"  {shared * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Conexiones por segundo con varios procesos de la API en la misma máquina.
+
+Simula el modo SOCKETIO_MESSAGE_QUEUE=sqlite: cada proceso mantiene HELD
+clientes en salas de municipios y, durante DURATION segundos, conecta
+clientes que entran en una sala, envían un evento por la cola de mensajes
+y se desconectan. Mide las conexiones atendidas con 1, 2, 4... procesos.
+No incluye el transporte websocket, solo el estado compartido de las salas
+y la cola. Uso: python bench/socketio_load.py [procesos ...]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Los módulos de la API leen HOME al importarse
+os.environ["HOME"] = tempfile.mkdtemp(prefix="catatom-bench-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rooms  # noqa: E402
+from socketqueue import SqliteManager  # noqa: E402
+
+DURATION = 5
+HELD = 200  # Clientes conectados todo el tiempo en cada proceso
+ROOMS = 2000
+WORKERS = [int(n) for n in sys.argv[1:]] or [1, 2, 4, 8]
+
+
+def serve(worker, start, result):
+    """Atiende conexiones hasta start + DURATION y devuelve cuántas."""
+    state = rooms.SharedRooms()
+    queue = SqliteManager(write_only=True)
+    rnd = random.Random(worker)
+    held = [
+        (f"held-{worker}-{i}", f"{rnd.randrange(ROOMS):05d}") for i in range(HELD)
+    ]
+    for sid, room in held:
+        state.joined(sid, room)
+    while time.time() < start:
+        time.sleep(0.01)
+    done = 0
+    while time.time() < start + DURATION:
+        sid = f"{worker}-{done}"
+        room = f"{rnd.randrange(ROOMS):05d}"
+        participants = state.joined(sid, room)
+        queue._publish({"event": "join", "room": room, "n": participants})
+        for joined in state.rooms(sid):
+            state.left(sid, joined)
+        done += 1
+    for sid, room in held:
+        state.left(sid, room)
+    result.put(done)
+
+
+def main():
+    print("procesos  conexiones/s  por proceso")
+    for workers in WORKERS:
+        result = multiprocessing.Queue()
+        start = time.time() + 1
+        procs = [
+            multiprocessing.Process(target=serve, args=(i, start, result))
+            for i in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+        total = sum(result.get() for __ in procs)
+        for proc in procs:
+            proc.join()
+        rate = total / DURATION
+        print(f"{workers:8d}  {rate:12.0f}  {rate / workers:11.0f}")
+
+
+if __name__ == "__main__":
+    main()
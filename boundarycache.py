@@ -0,0 +1,118 @@
+import json
+import logging
+import time
+
+from catatom2osm import boundary
+from catatom2osm.exceptions import CatValueError
+
+import db
+import metrics
+import municipalities
+
+
+TTL = 30 * 24 * 60 * 60
+OFFLINE = False
+
+log = logging.getLogger("socketio.server")
+
+counters = {"hits": 0, "misses": 0, "stale": 0, "errors": 0}
+
+
+def configure(ttl=None, offline=None):
+    """Fija la caducidad en segundos y el modo sin conexión."""
+    global TTL, OFFLINE
+    if ttl is not None:
+        TTL = ttl
+    if offline is not None:
+        OFFLINE = offline
+
+
+def _table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS boundary_cache (
+            kind TEXT NOT NULL,
+            mun_code TEXT NOT NULL,
+            value TEXT NOT NULL,
+            fetched REAL NOT NULL,
+            PRIMARY KEY (kind, mun_code)
+        )
+        """
+    )
+
+
+def _connect():
+    return db.connect(_table)
+
+
+def _cached(kind, mun_code, fetch):
+    """Respuesta guardada o consultada a Overpass si no existe o ha caducado.
+
+    Si la consulta falla se devuelve la copia caducada, si la hay. En modo
+    sin conexión nunca se consulta.
+    """
+    conn = _connect()
+    row = conn.execute(
+        "SELECT value, fetched FROM boundary_cache WHERE kind = ? AND mun_code = ?",
+        [kind, mun_code],
+    ).fetchone()
+    if row and (OFFLINE or time.time() - row["fetched"] < TTL):
+        counters["hits"] += 1
+        return json.loads(row["value"])
+    counters["misses"] += 1
+    if OFFLINE:
+        raise CatValueError(f"'{mun_code}' no está en la caché de límites")
+    try:
+        with metrics.timed("catatom_operation_seconds", op="overpass"):
+            value = fetch(mun_code)
+    except CatValueError:
+        raise
+    except Exception as e:
+        if not row:
+            counters["errors"] += 1
+            raise
+        counters["stale"] += 1
+        log.warning(f"Usando límites caducados de {mun_code}: {e}")
+        return json.loads(row["value"])
+    conn.execute(
+        "INSERT OR REPLACE INTO boundary_cache VALUES (?, ?, ?, ?)",
+        [kind, mun_code, json.dumps(value), time.time()],
+    )
+    return value
+
+
+def get_municipality(mun_code):
+    """Como boundary.get_municipality: (osm_id, nombre)."""
+    return tuple(_cached("municipality", mun_code, boundary.get_municipality))
+
+
+def get_districts(mun_code):
+    """Como boundary.get_districts: lista de (nivel, osm_id, nombre...)."""
+    return [
+        tuple(district)
+        for district in _cached("districts", mun_code, boundary.get_districts)
+    ]
+
+
+def prewarm(prov_code, districts=False):
+    """Carga en la caché los límites de los municipios de una provincia.
+
+    Devuelve la lista de códigos que no se han podido obtener.
+    """
+    errors = []
+    for mun_code, __ in municipalities.by_province(prov_code):
+        try:
+            get_municipality(mun_code)
+            if districts:
+                get_districts(mun_code)
+        except Exception:
+            log.exception(f"Error obteniendo los límites de {mun_code}")
+            errors.append(mun_code)
+    return errors
+
+
+def stats():
+    entries = _connect().execute(
+        "SELECT COUNT(*) FROM boundary_cache"
+    ).fetchone()[0]
+    return dict(counters, entries=entries, ttl=TTL, offline=OFFLINE)
@@ -0,0 +1,95 @@
+import fcntl
+import json
+import os
+import struct
+
+
+LOG = "chat.jsonl"
+INDEX = "chat.idx"
+LEGACY = "chat.json"
+PAGE_SIZE = 50
+
+_offset = struct.Struct("<Q")
+
+
+def _write(path, messages):
+    """Escribe el registro y el índice completos (migración de chat.json)."""
+    log = os.path.join(path, LOG)
+    index = os.path.join(path, INDEX)
+    with open(log + ".tmp", "wb") as fo, open(index + ".tmp", "wb") as fi:
+        for msg_id, msg in enumerate(messages):
+            fi.write(_offset.pack(fo.tell()))
+            fo.write(json.dumps(dict(msg, id=msg_id)).encode() + b"\n")
+    os.replace(log + ".tmp", log)
+    os.replace(index + ".tmp", index)
+
+
+def _migrate(path, fo):
+    """Convierte chat.json al formato JSON Lines. fo tiene el bloqueo."""
+    legacy = os.path.join(path, LEGACY)
+    if os.path.exists(legacy) and os.fstat(fo.fileno()).st_size == 0:
+        with open(legacy, "r") as fl:
+            _write(path, json.load(fl))
+        os.remove(legacy)
+        return True
+    return False
+
+
+def _replaced(fp, fo):
+    """Indica si fp se ha sustituido mientras se esperaba el bloqueo."""
+    try:
+        return not os.path.samestat(os.fstat(fo.fileno()), os.stat(fp))
+    except FileNotFoundError:
+        return True
+
+
+def append(path, msg):
+    """Añade un mensaje al final del registro y devuelve su número."""
+    fp = os.path.join(path, LOG)
+    while True:
+        with open(fp, "ab") as fo:
+            fcntl.flock(fo, fcntl.LOCK_EX)
+            if _replaced(fp, fo) or _migrate(path, fo):
+                continue
+            with open(os.path.join(path, INDEX), "ab") as fi:
+                msg_id = fi.tell() // _offset.size
+                position = fo.seek(0, os.SEEK_END)
+                fo.write(json.dumps(dict(msg, id=msg_id)).encode() + b"\n")
+                fo.flush()
+                # El índice se escribe después para que los lectores solo
+                # vean mensajes completos
+                fi.write(_offset.pack(position))
+            return msg_id
+
+
+def count(path):
+    fp = os.path.join(path, INDEX)
+    if not os.path.exists(fp):
+        return 0
+    return os.path.getsize(fp) // _offset.size
+
+
+def read(path, offset=None, limit=PAGE_SIZE):
+    """Mensajes desde el número offset, o los últimos si no se indica.
+
+    Usa el índice para ir directamente al primer mensaje de la página.
+    """
+    fp = os.path.join(path, LOG)
+    if not os.path.exists(fp) and os.path.exists(os.path.join(path, LEGACY)):
+        with open(fp, "ab") as fo:
+            fcntl.flock(fo, fcntl.LOCK_EX)
+            _migrate(path, fo)
+    total = count(path)
+    if offset is None:
+        offset = max(total - limit, 0)
+    end = min(offset + limit, total)
+    messages = []
+    if offset >= end:
+        return messages, total
+    with open(os.path.join(path, INDEX), "rb") as fi, open(fp, "rb") as fo:
+        fi.seek(offset * _offset.size)
+        positions = fi.read((end - offset) * _offset.size)
+        for (position,) in _offset.iter_unpack(positions):
+            fo.seek(position)
+            messages.append(json.loads(fo.readline()))
+    return messages, total
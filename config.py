@@ -24,3 +24,27 @@ class Config:
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10 Mb
     API_URL = os.getenv("API_URL", "http://127.0.0.1:5000")
     CLIENT_URL = os.getenv("CLIENT_URL", "http://127.0.0.1:8080")
+    # Procesos simultáneos. Con varios procesos de la API cada uno arranca
+    # los suyos (ver README)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 50))  # Procesos en cola
+    # Reciclar cada proceso de trabajo tras N trabajos o si supera N Mb
+    JOB_WORKER_MAX_JOBS = int(os.getenv("JOB_WORKER_MAX_JOBS", 20))
+    JOB_WORKER_MAX_RSS = int(os.getenv("JOB_WORKER_MAX_RSS", 4096)) * 1024 * 1024
+    # Exportar generando el zip sobre la marcha en lugar de guardarlo
+    EXPORT_STREAM = bool(int(os.getenv("EXPORT_STREAM", 0)))
+    # Caducidad en días de la caché de límites y uso sin conexión a Overpass
+    BOUNDARY_CACHE_TTL = int(os.getenv("BOUNDARY_CACHE_TTL", 30)) * 24 * 60 * 60
+    BOUNDARY_OFFLINE = bool(int(os.getenv("BOUNDARY_OFFLINE", 0)))
+    # Cola de mensajes de Socket.IO para ejecutar varios procesos de la API:
+    # "sqlite" (misma máquina) o una URL redis://, amqp://... Vacío: un proceso
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+    # Almacén de descargas del Catastro: cuota en Gb y antigüedad máxima en días
+    DATASET_QUOTA = int(os.getenv("DATASET_QUOTA", 20)) * 1024 * 1024 * 1024
+    DATASET_MAX_AGE = int(os.getenv("DATASET_MAX_AGE", 30)) * 24 * 60 * 60
+    # Precarga de info.json y splits.json: huecos de JOB_WORKERS que puede
+    # usar a la vez (0 la desactiva), pausa en segundos entre municipios y
+    # caducidad en días
+    PREWARM_WORKERS = int(os.getenv("PREWARM_WORKERS", 1))
+    PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", 5))
+    PREWARM_TTL = int(os.getenv("PREWARM_TTL", 7)) * 24 * 60 * 60
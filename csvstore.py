@@ -0,0 +1,157 @@
+import fcntl
+import json
+import os
+import sqlite3
+from tempfile import mkstemp
+
+from catatom2osm import csvtools
+
+
+class CsvStore:
+    """Tabla SQLite por proceso con las filas de un archivo CSV.
+
+    El CSV que genera catatom2osm se importa en el primer acceso y a partir
+    de ahí cada cambio es una actualización atómica de una fila. export
+    vuelve a escribir el CSV con el mismo formato y orden. columns define
+    columnas indexadas adicionales {nombre: función(campos)}.
+    """
+
+    def __init__(self, csv, columns=None):
+        self.csv = csv
+        name = os.path.splitext(csv)[0]
+        self.store = name + ".db"
+        self.lock = name + ".lock"
+        self.columns = columns or {}
+
+    def _values(self, fields):
+        return [func(fields) for func in self.columns.values()]
+
+    def _import(self, path):
+        rows = csvtools.csv2dict(os.path.join(path, self.csv), single=False)
+        fd, tmp = mkstemp(dir=path, suffix=".tmp")
+        os.close(fd)
+        try:
+            conn = sqlite3.connect(tmp)
+            extra = "".join(f", {column}" for column in self.columns)
+            conn.execute(
+                "CREATE TABLE rows (key TEXT PRIMARY KEY, pos INTEGER NOT NULL, "
+                f"fields TEXT NOT NULL{extra})"
+            )
+            for column in self.columns:
+                conn.execute(f"CREATE INDEX rows_{column} ON rows ({column})")
+            marks = ", ?" * len(self.columns)
+            conn.executemany(
+                f"INSERT INTO rows VALUES (?, ?, ?{marks})",
+                (
+                    [key, i, json.dumps(fields)] + self._values(fields)
+                    for i, (key, fields) in enumerate(rows.items())
+                ),
+            )
+            conn.commit()
+            conn.close()
+            os.replace(tmp, os.path.join(path, self.store))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def exists(self, path):
+        return os.path.exists(os.path.join(path, self.store))
+
+    def connect(self, path):
+        """Abre el almacén de un proceso, importando el CSV la primera vez."""
+        if not self.exists(path):
+            with open(os.path.join(path, self.lock), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if not self.exists(path):
+                    self._import(path)
+        conn = sqlite3.connect(
+            os.path.join(path, self.store), timeout=30, isolation_level=None
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def rows(self, path, *exprs, params=()):
+        """Filas (clave, campos, *exprs) en el orden del CSV."""
+        conn = self.connect(path)
+        extra = "".join(f", {expr}" for expr in exprs)
+        try:
+            return [
+                (row[0], json.loads(row[1])) + tuple(row[2:])
+                for row in conn.execute(
+                    f"SELECT key, fields{extra} FROM rows ORDER BY pos", params
+                )
+            ]
+        finally:
+            conn.close()
+
+    def get(self, path, key):
+        conn = self.connect(path)
+        try:
+            row = conn.execute(
+                "SELECT fields FROM rows WHERE key = ?", [key]
+            ).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+    def update(self, path, key, edit):
+        """Modifica una fila existente de forma atómica.
+
+        edit recibe los campos actuales y devuelve los nuevos; si lanza una
+        excepción la fila no cambia. Devuelve los nuevos campos o None si la
+        fila no existe.
+        """
+        conn = self.connect(path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT fields FROM rows WHERE key = ?", [key]
+                ).fetchone()
+                fields = None
+                if row:
+                    fields = edit(json.loads(row[0]))
+                    sets = "".join(f", {column} = ?" for column in self.columns)
+                    conn.execute(
+                        f"UPDATE rows SET fields = ?{sets} WHERE key = ?",
+                        [json.dumps(fields)] + self._values(fields) + [key],
+                    )
+                conn.execute("COMMIT")
+                return fields
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def put(self, path, key, fields):
+        """Sustituye una fila o la añade al final."""
+        conn = self.connect(path)
+        columns = "".join(f", {column}" for column in self.columns)
+        marks = ", ?" * len(self.columns)
+        sets = "".join(
+            f", {column} = excluded.{column}" for column in self.columns
+        )
+        try:
+            conn.execute(
+                f"INSERT INTO rows (key, pos, fields{columns}) VALUES "
+                f"(?, (SELECT COALESCE(MAX(pos), -1) + 1 FROM rows), ?{marks}) "
+                f"ON CONFLICT (key) DO UPDATE SET fields = excluded.fields{sets}",
+                [key, json.dumps(fields)] + self._values(fields),
+            )
+        finally:
+            conn.close()
+
+    def export(self, path):
+        """Escribe los cambios en el CSV y elimina el almacén."""
+        if self.exists(path):
+            data = {key: fields for key, fields in self.rows(path)}
+            csvtools.dict2csv(os.path.join(path, self.csv), data)
+        self.remove(path)
+
+    def remove(self, path):
+        for fn in [self.store, self.store + "-wal", self.store + "-shm", self.lock]:
+            fp = os.path.join(path, fn)
+            if os.path.exists(fp):
+                os.remove(fp)
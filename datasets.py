@@ -0,0 +1,194 @@
+import glob
+import logging
+import os
+import time
+import zipfile
+
+import db
+import workspace
+
+
+STORE_DIR = os.path.join(os.environ['HOME'], 'datasets')
+QUOTA = 20 * 1024 * 1024 * 1024
+MAX_AGE = 30 * 24 * 60 * 60  # No se reutilizan descargas más antiguas
+COUNTERS = ["hits", "misses", "evictions", "evicted_bytes"]
+
+log = logging.getLogger("socketio.server")
+
+
+def configure(quota=None, max_age=None):
+    """Fija la cuota en bytes y la antigüedad máxima en segundos."""
+    global QUOTA, MAX_AGE
+    if quota is not None:
+        QUOTA = quota
+    if max_age is not None:
+        MAX_AGE = max_age
+
+
+def _table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS datasets (
+            key TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            added REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS datasets_name ON datasets (name)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS datasets_last_used ON datasets (last_used)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS dataset_stats (
+            counter TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+
+
+def _connect():
+    return db.connect(_table)
+
+
+def _count(conn, counter, value=1):
+    conn.execute(
+        "INSERT INTO dataset_stats VALUES (?, ?) "
+        "ON CONFLICT (counter) DO UPDATE SET value = value + excluded.value",
+        [counter, value],
+    )
+
+
+def _path(key):
+    return os.path.join(STORE_DIR, key + ".zip")
+
+
+def key(fp):
+    """Clave de una descarga: nombre del conjunto y fecha de sus datos.
+
+    La fecha es la más reciente de los archivos del zip, así que dos
+    descargas del mismo conjunto sin cambios en origen tienen la misma
+    clave.
+    """
+    name = os.path.basename(fp)[:-len(".zip")]
+    with zipfile.ZipFile(fp) as zf:
+        stamp = max(info.date_time for info in zf.infolist())
+    return name, f"{name}.{'%04d%02d%02d%02d%02d%02d' % stamp}"
+
+
+def ingest(fp, download=True):
+    """Guarda una descarga en el almacén si no estaba ya.
+
+    Si el archivo no viene del almacén (download) cuenta como un fallo de
+    la caché. Devuelve la clave o None si no es un zip válido, no se ha
+    podido guardar o no cabe en la cuota.
+    """
+    try:
+        name, k = key(fp)
+    except (zipfile.BadZipFile, ValueError, OSError):
+        return None
+    conn = _connect()
+    now = time.time()
+    stored = os.path.exists(_path(k))
+    fresh = download and not (stored and os.path.samefile(fp, _path(k)))
+    if fresh:
+        _count(conn, "misses")
+    row = conn.execute("SELECT key FROM datasets WHERE key = ?", [k]).fetchone()
+    if row and stored:
+        conn.execute("UPDATE datasets SET last_used = ? WHERE key = ?", [now, k])
+        if fresh:
+            # Una descarga nueva con el mismo contenido confirma que sigue
+            # al día: cuenta para MAX_AGE desde ahora
+            conn.execute("UPDATE datasets SET added = ? WHERE key = ?", [now, k])
+        return k
+    try:
+        os.makedirs(STORE_DIR, exist_ok=True)
+        workspace.place(fp, _path(k), link=True)
+    except OSError:
+        log.exception(f"Error guardando {fp} en el almacén de descargas")
+        return None
+    conn.execute(
+        "INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, ?)",
+        [k, name, os.path.getsize(fp), now, now],
+    )
+    if k in evict():
+        return None
+    return k
+
+
+def seed(mun_code, path):
+    """Enlaza en la carpeta de un proceso las descargas guardadas de su
+    municipio que no tenga ya. Devuelve los nombres enlazados."""
+    conn = _connect()
+    now = time.time()
+    rows = conn.execute(
+        "SELECT name, key FROM datasets WHERE name LIKE ? AND added > ? "
+        "ORDER BY key",
+        [f"A.ES.SDGC.__.{mun_code}", now - MAX_AGE],
+    ).fetchall()
+    latest = {row["name"]: row["key"] for row in rows}
+    seeded = []
+    for name, k in latest.items():
+        dst = os.path.join(path, name + ".zip")
+        if os.path.exists(dst) or not os.path.exists(_path(k)):
+            continue
+        workspace.place(_path(k), dst, link=True)
+        conn.execute("UPDATE datasets SET last_used = ? WHERE key = ?", [now, k])
+        _count(conn, "hits")
+        seeded.append(name)
+    return seeded
+
+
+def evict(quota=None):
+    """Elimina las descargas usadas hace más tiempo hasta cumplir la cuota.
+
+    Las carpetas de proceso que las enlazan conservan su copia.
+    """
+    quota = QUOTA if quota is None else quota
+    conn = _connect()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM datasets").fetchone()[0]
+    rows = conn.execute("SELECT key, size FROM datasets ORDER BY last_used")
+    evicted = []
+    for row in rows.fetchall():
+        if total <= quota:
+            break
+        if os.path.exists(_path(row["key"])):
+            os.remove(_path(row["key"]))
+        conn.execute("DELETE FROM datasets WHERE key = ?", [row["key"]])
+        _count(conn, "evictions")
+        _count(conn, "evicted_bytes", row["size"])
+        total -= row["size"]
+        evicted.append(row["key"])
+    return evicted
+
+
+def import_dir(path):
+    """Guarda en el almacén las descargas de una carpeta (y subcarpetas)."""
+    pattern = os.path.join(path, "**", workspace.DATASET)
+    return [
+        k
+        for k in (
+            ingest(fp, download=False)
+            for fp in glob.iglob(pattern, recursive=True)
+        )
+        if k
+    ]
+
+
+def stats():
+    conn = _connect()
+    data = {counter: 0 for counter in COUNTERS}
+    for row in conn.execute("SELECT counter, value FROM dataset_stats"):
+        data[row["counter"]] = row["value"]
+    requests = data["hits"] + data["misses"]
+    data["hit_rate"] = data["hits"] / requests if requests else None
+    row = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM datasets"
+    ).fetchone()
+    data["datasets"], data["size"] = row[0], row[1]
+    data["quota"] = QUOTA
+    return data
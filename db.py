@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import threading
+
+import psutil
+
+
+DB_PATH = os.path.join(os.environ['HOME'], 'catatom.db')
+
+_connections = {}
+_started = {}  # Hora de arranque de este proceso, por pid tras fork
+
+
+def _prune():
+    """Cierra las conexiones de hilos que ya han terminado."""
+    alive = {thread.ident for thread in threading.enumerate()}
+    for key in list(_connections):
+        if key[0] == os.getpid() and key[1] not in alive:
+            _connections.pop(key)[0].close()
+
+
+def connect(setup=None, path=DB_PATH):
+    """Devuelve una conexión SQLite por proceso e hilo.
+
+    No se comparten tras fork ni entre hilos, para que las transacciones
+    de un hilo no se mezclen con las de otro. setup es una función que
+    crea o actualiza las tablas de un módulo y se ejecuta una sola vez por
+    conexión.
+    """
+    key = (os.getpid(), threading.get_ident(), path)
+    if key not in _connections:
+        _prune()
+        conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _connections[key] = (conn, set())
+    conn, ready = _connections[key]
+    if setup and setup not in ready:
+        setup(conn)
+        ready.add(setup)
+    return conn
+
+
+def data_version(conn):
+    """Cambia cuando otra conexión confirma cambios en la base de datos."""
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def add_columns(conn, table, columns):
+    """Añade a una tabla existente las columnas que le falten.
+
+    Devuelve True si se ha modificado la tabla.
+    """
+    current = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+    missing = [name for name in columns if name not in current]
+    for name in missing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}")
+    return bool(missing)
+
+
+def started(pid=None):
+    """Hora de arranque del proceso pid (por defecto este) o None si no existe.
+
+    Junto con el pid identifica un proceso aunque el pid se reutilice: tras
+    reiniciar el contenedor la API vuelve a ser el proceso 1, pero con otra
+    hora de arranque.
+    """
+    if pid is None:
+        pid = os.getpid()
+        if pid not in _started:
+            _started[pid] = psutil.Process(pid).create_time()
+        return _started[pid]
+    try:
+        return psutil.Process(pid).create_time()
+    except psutil.NoSuchProcess:
+        return None
+
+
+def alive(pid, start):
+    """Indica si sigue en marcha el proceso pid que arrancó en start."""
+    return pid is not None and start is not None and started(pid) == start
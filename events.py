@@ -0,0 +1,55 @@
+import logging
+import select
+
+
+class PipeHandler(logging.Handler):
+    """Envía cada línea de registro del proceso por una tubería."""
+
+    def __init__(self, conn, formatter=None):
+        super().__init__()
+        self.conn = conn
+        self.setFormatter(formatter or logging.Formatter())
+
+    def emit(self, record):
+        try:
+            lines = self.format(record).split("\n")
+            self.conn.send(("log", lines))
+        except Exception:
+            self.handleError(record)
+
+
+def wait_readable(conn, async_mode):
+    """Espera sin bloquear el bucle de eventos a que haya datos en conn."""
+    if async_mode == "eventlet":
+        from eventlet.hubs import trampoline
+        trampoline(conn.fileno(), read=True)
+    elif async_mode and async_mode.startswith("gevent"):
+        from gevent.socket import wait_read
+        wait_read(conn.fileno())
+    else:
+        select.select([conn], [], [])
+
+
+def receive(conn, async_mode=None):
+    """Genera lotes de eventos (evento, valor) hasta el evento "end".
+
+    Termina también si se cierra la tubería. Tras cada espera se recogen
+    todos los eventos pendientes para agrupar las líneas de registro en un
+    único envío.
+    """
+    while True:
+        wait_readable(conn, async_mode)
+        batch = []
+        try:
+            while conn.poll():
+                batch.append(conn.recv())
+                if batch[-1][0] == "end":
+                    break
+        except EOFError:
+            if batch:
+                yield batch
+            return
+        if batch:
+            yield batch
+            if batch[-1][0] == "end":
+                return
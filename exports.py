@@ -0,0 +1,210 @@
+import copy
+import glob
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+import zipfile
+from tempfile import mkstemp
+
+
+EXPORT_DIR = os.path.join(os.environ['HOME'], 'exports')
+SWEEP_INTERVAL = 60 * 60
+TMP_MAX_AGE = 60 * 60
+CHUNK_SIZE = 64 * 1024
+
+log = logging.getLogger("socketio.server")
+
+
+def _files(root, arcdir):
+    """Nombres en el zip de los archivos de la carpeta, en orden."""
+    for dirpath, dirnames, filenames in os.walk(os.path.join(root, arcdir)):
+        dirnames.sort()
+        for fn in sorted(filenames):
+            yield os.path.relpath(os.path.join(dirpath, fn), root)
+
+
+def _members(root, arcdir):
+    """Archivos de la carpeta como {nombre en el zip: [tamaño, mtime_ns]}."""
+    members = {}
+    for arcname in _files(root, arcdir):
+        stat = os.stat(os.path.join(root, arcname))
+        members[arcname] = [stat.st_size, stat.st_mtime_ns]
+    return members
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value).encode()).hexdigest()[:16]
+
+
+def _compression(arcname):
+    # Las tareas ya están comprimidas con gzip
+    if arcname.endswith(".gz"):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _copy_raw(zin, zout, info):
+    """Copia un miembro de otro zip sin descomprimirlo."""
+    zin.fp.seek(info.header_offset)
+    header = zin.fp.read(zipfile.sizeFileHeader)
+    name_len, extra_len = struct.unpack("<HH", header[-4:])
+    zin.fp.seek(name_len + extra_len, os.SEEK_CUR)
+    info = copy.copy(info)
+    info.extra = b""
+    info.flag_bits &= ~0x08
+    info.header_offset = zout.fp.tell()
+    zout.fp.write(info.FileHeader())
+    size = info.compress_size
+    while size > 0:
+        chunk = zin.fp.read(min(size, 1 << 20))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Miembro truncado {info.filename}")
+        zout.fp.write(chunk)
+        size -= len(chunk)
+    zout.filelist.append(info)
+    zout.NameToInfo[info.filename] = info
+    zout.start_dir = zout.fp.tell()
+
+
+def _build(fp, root, members, previous=None):
+    """Crea el zip reutilizando los miembros sin cambios de otro anterior."""
+    zin = None
+    old = {}
+    if previous:
+        try:
+            zin = zipfile.ZipFile(previous)
+            old = json.loads(zin.comment or b"{}")
+        except (OSError, ValueError, zipfile.BadZipFile):
+            zin = None
+    fd, tmp = mkstemp(dir=os.path.dirname(fp), suffix=".tmp")
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(tmp, "w") as zout:
+            for arcname, stat in members.items():
+                if zin and old.get(arcname) == stat:
+                    _copy_raw(zin, zout, zin.getinfo(arcname))
+                else:
+                    zout.write(
+                        os.path.join(root, arcname),
+                        arcname,
+                        compress_type=_compression(arcname),
+                    )
+            zout.comment = json.dumps(members).encode()
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, fp)
+    finally:
+        if zin:
+            zin.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def archive(root, arcdir):
+    """Devuelve (archivo abierto, etag) del zip de una carpeta de tareas.
+
+    El archivo se guarda por proceso y contenido: mientras ningún archivo
+    cambie se reutiliza. Si cambia, el nuevo zip copia tal cual los
+    miembros sin cambios del anterior y solo comprime los modificados.
+    Se devuelve abierto porque otra exportación simultánea de la misma
+    carpeta con otro contenido puede eliminarlo en cualquier momento.
+    """
+    members = _members(root, arcdir)
+    job = _digest(arcdir)
+    etag = _digest([arcdir, members])
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fp = os.path.join(EXPORT_DIR, f"{job}-{etag}.zip")
+    for __ in range(2):
+        try:
+            return open(fp, "rb"), etag
+        except FileNotFoundError:
+            pass
+        previous = glob.glob(os.path.join(EXPORT_DIR, f"{job}-*.zip"))
+        previous = [old for old in previous if old != fp]
+        _build(fp, root, members, previous[0] if previous else None)
+        for old in previous:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+    return open(fp, "rb"), etag
+
+
+def etag(root, arcdir):
+    """Etiqueta del contenido actual de una carpeta de tareas."""
+    return _digest([arcdir, _members(root, arcdir)])
+
+
+class _Buffer:
+    """Destino no posicionable para zipfile que acumula lo escrito."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def flushed(self):
+        """Devuelve lo acumulado, si hay algo, y vacía el búfer."""
+        if self.chunks:
+            data = b"".join(self.chunks)
+            self.chunks = []
+            yield data
+
+
+def stream(root, arcdir, chunk_size=CHUNK_SIZE):
+    """Genera el zip de una carpeta de tareas a trozos, sin archivo temporal.
+
+    El primer trozo sale tras leer el primer bloque del primer miembro, sea
+    cual sea el número de tareas.
+    """
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for arcname in _files(root, arcdir):
+            fp = os.path.join(root, arcname)
+            info = zipfile.ZipInfo.from_file(fp, arcname)
+            info.compress_type = _compression(arcname)
+            with open(fp, "rb") as src, zf.open(info, "w") as dst:
+                for data in iter(lambda: src.read(chunk_size), b""):
+                    dst.write(data)
+                    yield from buffer.flushed()
+            yield from buffer.flushed()
+    yield from buffer.flushed()
+
+
+def sweep(max_age=TMP_MAX_AGE):
+    """Elimina los zip temporales abandonados por una exportación fallida."""
+    count = 0
+    now = time.time()
+    for fp in glob.glob(os.path.join(EXPORT_DIR, "*.tmp")):
+        try:
+            if now - os.path.getmtime(fp) > max_age:
+                os.remove(fp)
+                count += 1
+        except FileNotFoundError:
+            pass
+    return count
+
+
+def sweeper(socketio, interval=SWEEP_INTERVAL):
+    while True:
+        try:
+            count = sweep()
+            if count:
+                log.info(f"Eliminadas {count} exportaciones temporales")
+        except OSError:
+            log.exception("Error limpiando exportaciones")
+        socketio.sleep(interval)
+
+
+def remove(arcdir):
+    """Elimina los zip guardados de una carpeta de tareas."""
+    job = _digest(arcdir)
+    for fp in glob.glob(os.path.join(EXPORT_DIR, f"{job}-*.zip")):
+        os.remove(fp)
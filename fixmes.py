@@ -0,0 +1,112 @@
+import time
+
+from catatom2osm import osmxml
+from csvstore import CsvStore
+
+
+LOCK_TIMEOUT = 24 * 60 * 60 # 1 day
+
+
+class Locked(Exception):
+    """La tarea está bloqueada por otro usuario."""
+
+    def __init__(self, fields):
+        super().__init__(fields)
+        self.fields = fields
+
+
+def locked_until(fields):
+    """Caducidad del bloqueo de una fila de review.txt (0 si no hay)."""
+    locked = fields[3] if len(fields) > 3 else None
+    if not locked or locked == "true":
+        return 0
+    return float(locked) + LOCK_TIMEOUT
+
+
+ELEMENTS = ["node", "way", "relation"]
+
+
+class NotValid(Exception):
+    """El archivo no es un OSM XML válido."""
+
+
+def scan(fo):
+    """Lee en un solo recorrido el comentario del conjunto de cambios y el
+    número de elementos con etiqueta fixme de un archivo OSM.
+
+    Libera cada elemento al terminar de leerlo, así que la memoria no
+    depende del tamaño del archivo.
+    """
+    comment = ""
+    count = 0
+    root = None
+    try:
+        for event, elem in osmxml.etree.iterparse(fo, events=("start", "end")):
+            if root is None:
+                root = elem
+                if root.tag != "osm":
+                    raise NotValid(root.tag)
+            if event != "end" or elem is root:
+                continue
+            if elem.tag == "changeset":
+                for tag in elem.iterfind("tag"):
+                    if tag.get("k") == "comment":
+                        comment = tag.get("v", "")
+            elif elem.tag in ELEMENTS:
+                if any(tag.get("k") == "fixme" for tag in elem.iterfind("tag")):
+                    count += 1
+            else:
+                continue
+            root.clear()
+    except osmxml.etree.ParseError as e:
+        raise NotValid(str(e))
+    if root is None:
+        raise NotValid("")
+    return comment, count
+
+
+store = CsvStore("review.txt", {"locked_until": locked_until})
+
+
+def rows(path):
+    """Filas (tarea, campos, bloqueo vigente) usando el índice de caducidad."""
+    return [
+        (task, fields, bool(active))
+        for task, fields, active in store.rows(
+            path, "locked_until > ?", params=[time.time()]
+        )
+    ]
+
+
+def lock(path, task, osm_id, username):
+    """Bloquea una tarea si está libre o ya es del usuario.
+
+    Lanza Locked si otro usuario tiene un bloqueo vigente.
+    """
+    def edit(fields):
+        if (
+            locked_until(fields) > time.time()
+            and fields[1] != osm_id
+        ):
+            raise Locked(fields)
+        return [str(fields[0]), osm_id, username, str(time.time())]
+
+    return store.update(path, task, edit)
+
+
+def update(path, task, fields):
+    """Sustituye los campos de una tarea existente."""
+    return store.update(path, task, lambda __: fields)
+
+
+def get(path, task):
+    return store.get(path, task)
+
+
+def export(path):
+    """Genera review.txt a partir del almacén y lo elimina."""
+    store.export(path)
+
+
+def remove(path):
+    store.remove(path)
@@ -0,0 +1,27 @@
+from csvstore import CsvStore
+
+
+store = CsvStore("highway_names.csv")
+
+
+def rows(path):
+    """Filas del callejero como [cat, conv, src, ...] en el orden del CSV."""
+    return [[cat] + fields for cat, fields in store.rows(path)]
+
+
+def update(path, cat, edit):
+    """Modifica una entrada existente. Ver CsvStore.update."""
+    return store.update(path, cat, edit)
+
+
+def put(path, cat, fields):
+    store.put(path, cat, fields)
+
+
+def export(path):
+    """Escribe las ediciones en highway_names.csv y elimina el almacén."""
+    store.export(path)
+
+
+def remove(path):
+    store.remove(path)
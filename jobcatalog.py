@@ -0,0 +1,124 @@
+import time
+
+import db
+
+
+SORT_FIELDS = [
+    "mun_code", "name", "split_name", "user", "status", "tasks", "parts",
+    "address", "updated",
+]
+FIELDS = [
+    "mun_code", "name", "split_id", "split_name", "user", "status", "tasks",
+    "parts", "address",
+]
+
+
+def _table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_catalog (
+            mun_code TEXT NOT NULL,
+            split_id TEXT NOT NULL DEFAULT '',
+            name TEXT,
+            split_name TEXT NOT NULL DEFAULT '',
+            user TEXT,
+            status TEXT,
+            tasks INTEGER NOT NULL DEFAULT 0,
+            parts INTEGER NOT NULL DEFAULT 0,
+            address INTEGER NOT NULL DEFAULT 0,
+            updated REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (mun_code, split_id)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS job_catalog_status ON job_catalog (status)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS job_catalog_user ON job_catalog (user)"
+    )
+
+
+def _connect():
+    return db.connect(_table)
+
+
+def replace(mun_code, rows):
+    """Sustituye las entradas del catálogo de un municipio."""
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM job_catalog WHERE mun_code = ?", [mun_code])
+        for row in rows:
+            conn.execute(
+                f"INSERT INTO job_catalog ({', '.join(FIELDS)}, updated) "
+                f"VALUES ({', '.join('?' * len(FIELDS))}, ?)",
+                [row[k] if k != "split_id" else row[k] or "" for k in FIELDS]
+                + [now],
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def count():
+    return _connect().execute("SELECT COUNT(*) FROM job_catalog").fetchone()[0]
+
+
+def clear():
+    _connect().execute("DELETE FROM job_catalog")
+
+
+def query(
+    status=None,
+    user=None,
+    prov=None,
+    mun_codes=None,
+    exclude=None,
+    sort="mun_code",
+    desc=False,
+    offset=0,
+    limit=None,
+):
+    """Devuelve el número total de entradas filtradas y una página de ellas.
+
+    mun_codes limita la consulta a esos municipios y exclude los omite.
+    """
+    where = []
+    params = []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if user:
+        where.append("user = ?")
+        params.append(user)
+    if prov:
+        where.append("mun_code LIKE ?")
+        params.append(prov + "%")
+    if mun_codes is not None:
+        where.append(f"mun_code IN ({', '.join('?' * len(mun_codes))})")
+        params += mun_codes
+    if exclude:
+        where.append(f"mun_code NOT IN ({', '.join('?' * len(exclude))})")
+        params += exclude
+    where = f"WHERE {' AND '.join(where)}" if where else ""
+    conn = _connect()
+    total = conn.execute(
+        f"SELECT COUNT(*) FROM job_catalog {where}", params
+    ).fetchone()[0]
+    sort = sort if sort in SORT_FIELDS else "mun_code"
+    order = "DESC" if desc else "ASC"
+    rows = conn.execute(
+        f"SELECT * FROM job_catalog {where} "
+        f"ORDER BY {sort} {order}, mun_code, split_name "
+        f"LIMIT ? OFFSET ?",
+        params + [-1 if limit is None else limit, offset],
+    )
+    data = []
+    for row in rows:
+        row = {k: row[k] for k in FIELDS}
+        row["split_id"] = row["split_id"] or None
+        data.append(row)
+    return total, data
@@ -0,0 +1,224 @@
+import glob
+import json
+import os
+import time
+
+import db
+import logtail
+import metrics
+
+
+WORK_DIR = os.path.join(os.environ['HOME'], 'results')
+FLAGS = ["user", "error", "report", "highway_names", "review"]
+FIELDS = FLAGS + ["tasks", "args", "split"]
+
+_rows = {}
+_version = None
+
+
+def _table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_status (
+            mun_code TEXT PRIMARY KEY,
+            user INTEGER NOT NULL DEFAULT 0,
+            error INTEGER NOT NULL DEFAULT 0,
+            report INTEGER NOT NULL DEFAULT 0,
+            highway_names INTEGER NOT NULL DEFAULT 0,
+            review INTEGER NOT NULL DEFAULT 0,
+            tasks TEXT NOT NULL DEFAULT '[]'
+        )
+        """
+    )
+    columns = {
+        "args": "TEXT NOT NULL DEFAULT ''",
+        "split": "TEXT",
+        "updated": "REAL NOT NULL DEFAULT 0",
+    }
+    if db.add_columns(conn, "job_status", columns):
+        # Las filas antiguas no tienen los nuevos campos: se reconstruirán
+        conn.execute("DELETE FROM job_status")
+
+
+def _connect():
+    return db.connect(_table)
+
+
+def _row(row):
+    data = {flag: bool(row[flag]) for flag in FLAGS}
+    data["tasks"] = json.loads(row["tasks"])
+    data["args"] = row["args"]
+    data["split"] = row["split"]
+    data["updated"] = row["updated"]
+    return data
+
+
+def _load():
+    """Recarga la copia en memoria si otro proceso ha modificado el índice."""
+    global _version
+    conn = _connect()
+    version = (os.getpid(), db.data_version(conn))
+    if version != _version:
+        _rows.clear()
+        for row in conn.execute("SELECT * FROM job_status"):
+            _rows[row["mun_code"]] = _row(row)
+        _version = version
+    return _rows
+
+
+def _report_options(path):
+    """Argumentos y división del último proceso según report.json."""
+    fp = os.path.join(path, "report.json")
+    report = {}
+    if os.path.exists(fp):
+        with open(fp, "r") as fo:
+            report = json.load(fo)
+    options = report.get("options", "") or ""
+    args = "-b" if options.startswith("-b ") else ""
+    args = "-d" if options.startswith("-d ") else args
+    return args, report.get("split_id", None)
+
+
+def probe(mun_code):
+    """Lee del disco los indicadores de estado de un proceso."""
+    with metrics.timed("catatom_operation_seconds", op="probe"):
+        return _probe(mun_code)
+
+
+def _probe(mun_code):
+    path = os.path.join(WORK_DIR, mun_code)
+
+    def exists(*args):
+        return os.path.exists(os.path.join(path, *args))
+
+    tasks = [
+        os.path.relpath(fp, path)
+        for pattern in ["tasks*", os.path.join("*", "tasks*")]
+        for fp in glob.glob(os.path.join(path, pattern))
+        if os.path.isdir(fp)
+    ]
+    args, split = _report_options(path)
+    log = os.path.join(path, "catatom2osm.log")
+    return {
+        "user": exists("user.json"),
+        "error": "ERROR" in logtail.last_line(log),
+        "report": exists("report.txt"),
+        "highway_names": exists("highway_names.csv"),
+        "review": exists("review.txt"),
+        "tasks": sorted(tasks),
+        "args": args,
+        "split": split,
+    }
+
+
+def _same(row, data):
+    return row is not None and all(row[k] == data[k] for k in FIELDS)
+
+
+def update(mun_code, data):
+    if _same(_load().get(mun_code), data):
+        return
+    data = dict(data, updated=time.time())
+    _connect().execute(
+        """
+        INSERT OR REPLACE INTO job_status
+        (mun_code, user, error, report, highway_names, review, tasks, args,
+        split, updated)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [mun_code] + [int(data[flag]) for flag in FLAGS] + [
+            json.dumps(data["tasks"]), data["args"], data["split"], data["updated"]
+        ],
+    )
+    _rows[mun_code] = data
+
+
+def refresh(mun_code):
+    """Actualiza el índice tras un cambio de estado del proceso."""
+    update(mun_code, probe(mun_code))
+
+
+def remove(mun_code):
+    _connect().execute("DELETE FROM job_status WHERE mun_code = ?", [mun_code])
+    _rows.pop(mun_code, None)
+
+
+def get(mun_code):
+    return _load().get(mun_code)
+
+
+def count():
+    return _connect().execute("SELECT COUNT(*) FROM job_status").fetchone()[0]
+
+
+def status(mun_code, target_dir="", tasks_dir="tasks"):
+    """Nombre del estado de un proceso según el índice, sin acceder al disco."""
+    row = get(mun_code)
+    if not row or not row["user"]:
+        return "AVAILABLE"
+    if row["error"]:
+        return "ERROR"
+    if row["report"]:
+        if row["highway_names"]:
+            return "REVIEW"
+        if row["review"]:
+            return "FIXME"
+        if os.path.join(target_dir, tasks_dir) in row["tasks"]:
+            return "DONE"
+        return "AVAILABLE"
+    return "RUNNING"
+
+
+def default_status(mun_code):
+    """Estado que tendría Work(mun_code), sin construirlo."""
+    row = get(mun_code)
+    if not row:
+        return "AVAILABLE"
+    return status(mun_code, row["split"] or "", "tasks" + row["args"])
+
+
+def split_status(mun_code, split):
+    """Estado que tendría Work(mun_code, split), sin construirlo."""
+    row = get(mun_code)
+    tasks = row["tasks"] if row else []
+    args = ""
+    for arg in ["-b", "-d"]:
+        if not args and os.path.join(split, "tasks" + arg) in tasks:
+            args = arg
+    return status(mun_code, split, "tasks" + args)
+
+
+def last_modified(prefix=""):
+    """Fecha de la última actualización de los procesos con ese prefijo."""
+    return max(
+        [row["updated"] for k, row in _load().items() if k.startswith(prefix)],
+        default=0,
+    )
+
+
+def mun_codes():
+    return sorted(
+        os.path.basename(fp)
+        for fp in glob.glob(os.path.join(WORK_DIR, "?????"))
+        if os.path.isdir(fp)
+    )
+
+
+def rebuild():
+    """Reconstruye el índice a partir de los archivos en disco."""
+    codes = mun_codes()
+    for mun_code in set(_load().keys()) - set(codes):
+        remove(mun_code)
+    for mun_code in codes:
+        refresh(mun_code)
+    return len(codes)
+
+
+def verify():
+    """Devuelve los códigos de municipio cuyo índice no coincide con el disco."""
+    rows = _load()
+    errors = []
+    for mun_code in sorted(set(rows.keys()) | set(mun_codes())):
+        if not _same(rows.get(mun_code), probe(mun_code)):
+            errors.append(mun_code)
+    return errors
@@ -0,0 +1,235 @@
+import json
+import os
+
+import db
+
+
+_positions = {}
+_version = None
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mun_code TEXT NOT NULL,
+            split TEXT,
+            priority INTEGER NOT NULL DEFAULT 0,
+            params TEXT NOT NULL DEFAULT '{}',
+            state TEXT NOT NULL DEFAULT 'queued',
+            pid INTEGER
+        )
+        """
+    )
+    # Hora de arranque del proceso pid, ver db.started
+    db.add_columns(conn, "job_queue", {"started": "REAL"})
+    # Hora del último cambio en la cola de cada provincia
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_queue_changes (
+            prov_code TEXT PRIMARY KEY,
+            updated REAL NOT NULL
+        )
+        """
+    )
+    now = "(julianday('now') - 2440587.5) * 86400"
+    for event, row in [
+        ("INSERT", "NEW"), ("DELETE", "OLD"), ("UPDATE OF state", "NEW")
+    ]:
+        name = "job_queue_" + event.split()[0].lower()
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON job_queue
+            BEGIN
+                INSERT OR REPLACE INTO job_queue_changes
+                VALUES (substr({row}.mun_code, 1, 2), {now});
+            END
+            """
+        )
+
+
+def _connect():
+    return db.connect(_table)
+
+
+def _invalidate():
+    global _version
+    _version = None
+
+
+def _load():
+    """Posiciones en cola por municipio, recargadas si la cola ha cambiado."""
+    global _version
+    conn = _connect()
+    version = (os.getpid(), db.data_version(conn))
+    if version != _version:
+        _positions.clear()
+        rows = conn.execute(
+            "SELECT mun_code FROM job_queue WHERE state = 'queued' "
+            "ORDER BY priority, id"
+        )
+        for i, row in enumerate(rows):
+            _positions[row["mun_code"]] = i + 1
+        _version = version
+    return _positions
+
+
+def _item(row):
+    item = dict(row)
+    item["params"] = json.loads(item["params"])
+    return item
+
+
+def position(mun_code):
+    """Posición en la cola de un municipio (desde 1) o None."""
+    return _load().get(mun_code)
+
+
+def params(mun_code):
+    """Parámetros del proceso de un municipio en la cola o None."""
+    row = _connect().execute(
+        "SELECT params FROM job_queue WHERE mun_code = ?", [mun_code]
+    ).fetchone()
+    return json.loads(row["params"]) if row else None
+
+
+def owner(mun_code):
+    """Usuario que ha encolado el proceso de un municipio."""
+    return (params(mun_code) or {}).get("user")
+
+
+def queued():
+    """Municipios en espera por orden de posición."""
+    return list(_load().keys())
+
+
+def waiting_items():
+    """Trabajos en espera por orden de posición."""
+    rows = _connect().execute(
+        "SELECT * FROM job_queue WHERE state = 'queued' ORDER BY priority, id"
+    )
+    return [_item(row) for row in rows]
+
+
+def pending():
+    return len(_load())
+
+
+def waiting(priority):
+    """Trabajos en espera con una prioridad dada."""
+    return _connect().execute(
+        "SELECT COUNT(*) FROM job_queue WHERE state = 'queued' AND priority = ?",
+        [priority],
+    ).fetchone()[0]
+
+
+def last_modified(prov_code):
+    """Hora del último cambio en la cola de los municipios de una provincia."""
+    row = _connect().execute(
+        "SELECT updated FROM job_queue_changes WHERE prov_code = ?", [prov_code]
+    ).fetchone()
+    return row["updated"] if row else 0
+
+
+def states():
+    """Estado en la cola ('queued' o 'running') de cada municipio."""
+    rows = _connect().execute("SELECT mun_code, state FROM job_queue")
+    return {row["mun_code"]: row["state"] for row in rows}
+
+
+def push(mun_code, split, params, priority=0, capacity=None):
+    """Encola un proceso y devuelve su posición.
+
+    Devuelve None si el municipio ya está en cola o en proceso y lanza
+    QueueFull si se supera la capacidad.
+    """
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        busy = conn.execute(
+            "SELECT 1 FROM job_queue WHERE mun_code = ?", [mun_code]
+        ).fetchone()
+        if busy:
+            conn.execute("ROLLBACK")
+            return None
+        queued = conn.execute(
+            "SELECT COUNT(*) FROM job_queue WHERE state = 'queued'"
+        ).fetchone()[0]
+        if capacity is not None and queued >= capacity:
+            conn.execute("ROLLBACK")
+            raise QueueFull()
+        conn.execute(
+            "INSERT INTO job_queue (mun_code, split, priority, params) "
+            "VALUES (?, ?, ?, ?)",
+            [mun_code, split, priority, json.dumps(params)],
+        )
+        conn.execute("COMMIT")
+    except QueueFull:
+        raise
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _invalidate()
+    return position(mun_code)
+
+
+def claim():
+    """Marca como en proceso el siguiente trabajo de la cola y lo devuelve."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT * FROM job_queue WHERE state = 'queued' "
+            "ORDER BY priority, id LIMIT 1"
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE job_queue SET state = 'running', pid = ?, started = ? "
+                "WHERE id = ?",
+                [os.getpid(), db.started(), row["id"]],
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _invalidate()
+    return _item(row) if row else None
+
+
+def remove(item_id):
+    _connect().execute("DELETE FROM job_queue WHERE id = ?", [item_id])
+    _invalidate()
+
+
+def cancel(mun_code):
+    """Quita de la cola un municipio que aún no se ha empezado a procesar."""
+    cur = _connect().execute(
+        "DELETE FROM job_queue WHERE mun_code = ? AND state = 'queued'",
+        [mun_code],
+    )
+    _invalidate()
+    return cur.rowcount > 0
+
+
+def recover():
+    """Elimina trabajos en proceso cuyo planificador ya no existe.
+
+    El planificador se identifica por pid y hora de arranque, así que se
+    eliminan también los de un proceso anterior con el mismo pid.
+    Devuelve los trabajos eliminados.
+    """
+    conn = _connect()
+    rows = conn.execute(
+        "SELECT * FROM job_queue WHERE state = 'running'"
+    ).fetchall()
+    removed = []
+    for row in rows:
+        if not db.alive(row["pid"], row["started"]):
+            remove(row["id"])
+            removed.append(_item(row))
+    return removed
@@ -0,0 +1,59 @@
+import os
+import time
+
+import db
+
+
+def _table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            pid INTEGER NOT NULL,
+            expires REAL NOT NULL
+        )
+        """
+    )
+    # Hora de arranque del proceso pid, ver db.started
+    db.add_columns(conn, "leases", {"started": "REAL"})
+
+
+def _connect():
+    return db.connect(_table)
+
+
+def acquire(name, ttl):
+    """Reserva name para este proceso durante ttl segundos.
+
+    Devuelve True si el proceso ya la tenía, en cuyo caso se renueva, o
+    si estaba libre, caducada o su proceso ya no existe. El proceso se
+    identifica por pid y hora de arranque, así que tras reiniciar con el
+    mismo pid no se confunde con el anterior. Sirve para que una tarea
+    periódica se ejecute en un solo proceso de la API.
+    """
+    conn = _connect()
+    now = time.time()
+    pid, started = os.getpid(), db.started()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT pid, started, expires FROM leases WHERE name = ?", [name]
+        ).fetchone()
+        owner = (
+            row is None
+            or row["expires"] < now
+            or (row["pid"], row["started"]) == (pid, started)
+            or not db.alive(row["pid"], row["started"])
+        )
+        if owner:
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, pid, expires, started) "
+                "VALUES (?, ?, ?, ?)",
+                [name, pid, now + ttl, started],
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return owner
+
@@ -0,0 +1,79 @@
+import os
+
+
+HEAD_SIZE = 64
+MAX_CHECKPOINTS = 64
+BLOCK_SIZE = 4096
+
+_checkpoints = {}
+
+
+def _points(fn, fo):
+    """Posiciones conocidas {línea: byte} de un archivo.
+
+    Se descartan si el archivo ha sido sustituido o truncado (cambia el
+    inodo o la cabecera).
+    """
+    stat = os.fstat(fo.fileno())
+    key = (stat.st_dev, stat.st_ino, fo.read(HEAD_SIZE))
+    cached_key, points = _checkpoints.get(fn, (None, None))
+    if cached_key != key or max(points.values()) > stat.st_size:
+        points = {0: 0}
+        _checkpoints[fn] = (key, points)
+    return points
+
+
+def _save(points, row, offset):
+    points[row] = offset
+    while len(points) > MAX_CHECKPOINTS:
+        del points[next(k for k in points if k != 0)]
+
+
+def read_from(fn, from_row=0):
+    """Devuelve las líneas de un archivo a partir de from_row y el total.
+
+    Solo lee los bytes posteriores a la posición conocida más cercana.
+    """
+    if not os.path.exists(fn):
+        return [], 0
+    with open(fn, "rb") as fo:
+        points = _points(fn, fo)
+        row = max(k for k in points if k <= from_row)
+        fo.seek(points[row])
+        while row < from_row:
+            line = fo.readline()
+            if not line:
+                return [], row
+            row += 1
+            if not line.endswith(b"\n"):
+                return [], row
+        if row not in points:
+            _save(points, row, fo.tell())
+        start = fo.tell()
+        data = fo.read()
+    lines = data.split(b"\n")
+    partial = lines.pop()
+    if lines:
+        _save(points, row + len(lines), start + len(data) - len(partial))
+    if partial:
+        lines.append(partial)
+    return [line.decode() for line in lines], row + len(lines)
+
+
+def last_line(fn):
+    """Última línea de un archivo, leída desde el final."""
+    if not os.path.exists(fn):
+        return ""
+    with open(fn, "rb") as fo:
+        pos = fo.seek(0, os.SEEK_END)
+        data = b""
+        while pos > 0:
+            size = min(BLOCK_SIZE, pos)
+            pos -= size
+            fo.seek(pos)
+            data = fo.read(size) + data
+            tail = data[:-1] if data.endswith(b"\n") else data
+            if b"\n" in tail:
+                break
+    tail = data[:-1] if data.endswith(b"\n") else data
+    return tail.rsplit(b"\n", 1)[-1].decode()
@@ -0,0 +1,126 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Límites de los cubos de los histogramas, en segundos
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    30, 60, 300, 900, 1800, 3600,
+)
+RSS_BUCKETS = tuple(2 ** n * 1024 * 1024 for n in range(7, 15))  # 128 Mb a 16 Gb
+
+_lock = threading.Lock()
+_histograms = {}  # nombre -> (ayuda, cubos, {etiquetas: [cubos..., suma]})
+_collectors = []  # (nombre, ayuda, tipo, función que devuelve [(etiquetas, valor)])
+
+
+def histogram(name, help, buckets=BUCKETS):
+    """Declara un histograma."""
+    _histograms.setdefault(name, (help, buckets, {}))
+
+
+def observe(name, value, **labels):
+    help, buckets, series = _histograms[name]
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        data = series.get(key)
+        if data is None:
+            data = series[key] = [0] * (len(buckets) + 2)
+        data[bisect.bisect_left(buckets, value)] += 1
+        data[-1] += value
+
+
+@contextmanager
+def timed(name, **labels):
+    """Mide la duración del bloque en el histograma name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+class Stopwatch:
+    """Duración de fases consecutivas de un proceso."""
+
+    def __init__(self):
+        self.stages = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        """Termina la fase stage y empieza la siguiente."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0) + now - self._last
+        self._last = now
+        return self.stages
+
+
+def register(name, help, kind, collect):
+    """Añade métricas que se calculan al consultarlas.
+
+    collect devuelve una lista de (etiquetas, valor). kind es "gauge" o
+    "counter".
+    """
+    _collectors.append((name, help, kind, collect))
+
+
+def _labels(labels, **extra):
+    items = list(labels) + sorted(extra.items())
+    if not items:
+        return ""
+    text = ",".join(
+        '{}="{}"'.format(
+            k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for k, v in items
+    )
+    return "{" + text + "}"
+
+
+def render():
+    """Métricas en el formato de texto de Prometheus."""
+    lines = []
+    for name, (help, buckets, series) in sorted(_histograms.items()):
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+        with _lock:
+            series = {key: list(data) for key, data in series.items()}
+        for key, data in sorted(series.items()):
+            count = 0
+            for bound, n in zip(buckets, data):
+                count += n
+                lines.append(f"{name}_bucket{_labels(key, le=bound)} {count}")
+            count += data[-2]
+            lines.append(f"{name}_bucket{_labels(key, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{_labels(key)} {data[-1]}")
+            lines.append(f"{name}_count{_labels(key)} {count}")
+    for name, help, kind, collect in _collectors:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for labels, value in collect():
+            if value is not None:
+                lines.append(f"{name}{_labels(sorted(labels.items()))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+histogram(
+    "catatom_request_seconds", "Duración de las peticiones a la API por recurso"
+)
+histogram(
+    "catatom_operation_seconds",
+    "Duración de operaciones internas (work, probe, overpass)",
+)
+histogram("catatom_job_stage_seconds", "Duración de las fases de los procesos")
+histogram(
+    "catatom_job_peak_rss_bytes",
+    "Memoria residente máxima de cada proceso",
+    RSS_BUCKETS,
+)
+
+
+def observe_job(stats):
+    """Registra las estadísticas que devuelve un Worker al terminar."""
+    for stage, seconds in (stats.get("stages") or {}).items():
+        observe("catatom_job_stage_seconds", seconds, stage=stage)
+    if stats.get("peak_rss"):
+        observe("catatom_job_peak_rss_bytes", stats["peak_rss"])
@@ -0,0 +1,42 @@
+import os
+from functools import lru_cache
+
+from catatom2osm import config as cat_config
+from catatom2osm import csvtools
+
+
+@lru_cache(maxsize=None)
+def _index():
+    """Municipios por código de provincia, leídos una vez de catatom2osm."""
+    fn = os.path.join(cat_config.app_path, "municipalities.csv")
+    index = {}
+    for row in csvtools.startswith(fn, ""):
+        mun_code = row[0]
+        if len(mun_code) == 5 and mun_code.isdigit():
+            index.setdefault(mun_code[:2], []).append((mun_code, row[2]))
+    return index
+
+
+@lru_cache(maxsize=None)
+def _names():
+    return {
+        mun_code: name for muns in _index().values() for mun_code, name in muns
+    }
+
+
+def load():
+    _index()
+
+
+def by_province(prov_code):
+    """Lista de (código, nombre) de los municipios de una provincia."""
+    return _index().get(prov_code, [])
+
+
+def all_codes():
+    return [mun[0] for muns in _index().values() for mun in muns]
+
+
+def name(mun_code):
+    """Nombre de un municipio o None si no existe."""
+    return _names().get(mun_code)
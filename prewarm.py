@@ -0,0 +1,187 @@
+import collections
+import logging
+import os
+import threading
+import time
+
+import events
+import leases
+import metrics
+import municipalities
+import splits
+from work import CACHE_DIR, Work
+
+
+PASS_INTERVAL = 60 * 60  # Segundos entre recorridos de la lista de municipios
+LEASE = "prewarm"
+LEASE_TTL = 30 * 60  # Sin renovarla, otro proceso de la API toma la precarga
+POLL_INTERVAL = 0.5
+
+log = logging.getLogger("socketio.server")
+
+
+def _fresh(fp, ttl):
+    try:
+        return time.time() - os.path.getmtime(fp) < ttl
+    except FileNotFoundError:
+        return False
+
+
+def _in_thread(socketio, func, *args):
+    """Ejecuta func en un hilo del sistema y espera su resultado.
+
+    La API no parchea la biblioteca estándar, así que las llamadas que
+    bloquean (HTTP, disco) se sacan del bucle de eventos.
+    """
+    done = threading.Event()
+    result = {}
+
+    def run():
+        try:
+            result["value"] = func(*args)
+        except Exception as e:
+            result["error"] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    while not done.is_set():
+        socketio.sleep(POLL_INTERVAL)
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def _files(mun_code):
+    cache = os.path.join(CACHE_DIR, mun_code)
+    return os.path.join(cache, "info.json"), os.path.join(cache, "splits.json")
+
+
+class Prewarmer:
+    """Rellena en segundo plano info.json y splits.json de la caché.
+
+    Recorre los municipios sin procesar y obtiene los archivos que faltan
+    o han caducado. No tiene procesos propios: los huecos del planificador
+    sin procesos en cola piden municipios con take y los obtienen con su
+    Worker, así que la precarga cuenta dentro de JOB_WORKERS. Usa como
+    mucho workers huecos a la vez, con una pausa entre municipios. Con
+    varios procesos de la API solo hace la precarga el que tiene la
+    reserva LEASE en catatom.db.
+    """
+
+    def __init__(self, socketio, workers=1, interval=5, ttl=7 * 24 * 60 * 60):
+        self.socketio = socketio
+        self.workers = workers
+        self.interval = interval
+        self.ttl = ttl
+        self.busy = 0
+        self._queue = collections.deque()
+        self._last_pass = 0
+        self._last_take = 0
+        self.counters = {"info": 0, "splits": 0, "errors": 0, "passes": 0}
+
+    def _missing(self, mun_code):
+        """Archivos de la caché que hay que obtener para un municipio."""
+        info, splits_json = _files(mun_code)
+        return (
+            not _fresh(info, self.ttl),
+            not _fresh(splits_json, self.ttl),
+        )
+
+    def pending(self):
+        """Municipios sin procesar con algún archivo por obtener."""
+        return [
+            mun_code
+            for mun_code in municipalities.all_codes()
+            if any(self._missing(mun_code))
+            and Work.get_status(mun_code) == Work.Status.AVAILABLE
+        ]
+
+    def _next(self):
+        if not leases.acquire(LEASE, LEASE_TTL):
+            self._queue.clear()
+            return None
+        if not self._queue and time.time() - self._last_pass > PASS_INTERVAL:
+            self._last_pass = time.time()
+            self._queue.extend(_in_thread(self.socketio, self.pending))
+            self.counters["passes"] += 1
+        try:
+            return self._queue.popleft()
+        except IndexError:
+            return None
+
+    def take(self):
+        """Municipio que precargar en un hueco libre del planificador o None."""
+        if self.busy >= self.workers:
+            return None
+        if time.time() - self._last_take < self.interval:
+            return None
+        mun_code = self._next()
+        if mun_code:
+            self.busy += 1
+            self._last_take = time.time()
+        return mun_code
+
+    def _fetch_info(self, worker, mun_code):
+        """Pide el resumen a un Worker y devuelve sus estadísticas."""
+        worker.send(mun_code, None, None, {}, action="info")
+        async_mode = self.socketio.server.eio.async_mode
+        stats = None
+        for batch in events.receive(worker.conn, async_mode):
+            for event, value in batch:
+                if event == "end":
+                    stats = value
+        return stats
+
+    def fetch(self, worker, mun_code):
+        """Obtiene los archivos de un municipio devuelto por take.
+
+        Devuelve True si hay que sustituir el Worker del hueco.
+        """
+        info, splits_json = _files(mun_code)
+        need_info, need_splits = self._missing(mun_code)
+        replace = False
+        try:
+            if need_splits:
+                os.makedirs(os.path.dirname(splits_json), exist_ok=True)
+                _in_thread(self.socketio, splits.refresh, mun_code, splits_json)
+                self.counters["splits"] += 1
+            if need_info:
+                replace = True
+                stats = self._fetch_info(worker, mun_code)
+                if stats:
+                    metrics.observe_job(stats)
+                    replace = stats["recycle"]
+                if not os.path.exists(info):
+                    raise RuntimeError("catatom2osm no generó info.json")
+                self.counters["info"] += 1
+        except Exception:
+            log.exception(f"Error precargando la caché de {mun_code}")
+            self.counters["errors"] += 1
+        finally:
+            self.busy -= 1
+        return replace
+
+    def coverage(self):
+        """Municipios sin procesar que ya tienen sus archivos en la caché."""
+        available = info = splits_json = complete = 0
+        for mun_code in municipalities.all_codes():
+            if Work.get_status(mun_code) != Work.Status.AVAILABLE:
+                continue
+            need_info, need_splits = self._missing(mun_code)
+            available += 1
+            info += not need_info
+            splits_json += not need_splits
+            complete += not (need_info or need_splits)
+        return dict(
+            self.counters,
+            municipalities=available,
+            cached_info=info,
+            cached_splits=splits_json,
+            complete=complete,
+            coverage=complete / available if available else 1,
+            queued=len(self._queue),
+            workers=self.workers,
+            interval=self.interval,
+            ttl=self.ttl,
+        )
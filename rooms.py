@@ -0,0 +1,127 @@
+import os
+import time
+
+import db
+
+
+class LocalRooms:
+    """Participantes de las salas en memoria, para un único proceso.
+
+    Guarda las salas de cada cliente y el número de participantes de cada
+    sala, así que una desconexión solo recorre las salas de ese cliente.
+    """
+
+    def __init__(self):
+        self._rooms = {}
+        self._counts = {}
+
+    def joined(self, sid, room):
+        rooms = self._rooms.setdefault(sid, set())
+        if room not in rooms:
+            rooms.add(room)
+            self._counts[room] = self._counts.get(room, 0) + 1
+        return self._counts[room]
+
+    def left(self, sid, room):
+        rooms = self._rooms.get(sid, set())
+        if room in rooms:
+            rooms.remove(room)
+            if not rooms:
+                del self._rooms[sid]
+            self._counts[room] -= 1
+            if not self._counts[room]:
+                del self._counts[room]
+        return self._counts.get(room, 0)
+
+    def rooms(self, sid):
+        return list(self._rooms.get(sid, ()))
+
+    def count(self, room):
+        return self._counts.get(room, 0)
+
+    def counts(self):
+        """Participantes de cada sala con alguno."""
+        return dict(self._counts)
+
+
+def _table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS room_members (
+            room TEXT NOT NULL,
+            sid TEXT NOT NULL,
+            pid INTEGER NOT NULL,
+            joined REAL NOT NULL,
+            PRIMARY KEY (room, sid)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS room_members_sid ON room_members (sid)"
+    )
+    # Hora de arranque del proceso pid, ver db.started
+    db.add_columns(conn, "room_members", {"started": "REAL"})
+
+
+class SharedRooms:
+    """Participantes de las salas compartidos por los procesos de la API.
+
+    Se guardan en la base de datos común, así que el número de
+    participantes incluye los clientes conectados a cualquier proceso.
+    """
+
+    def _connect(self):
+        return db.connect(_table)
+
+    def joined(self, sid, room):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO room_members (room, sid, pid, joined, started) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [room, sid, os.getpid(), time.time(), db.started()],
+        )
+        return self.count(room)
+
+    def left(self, sid, room):
+        conn = self._connect()
+        conn.execute(
+            "DELETE FROM room_members WHERE room = ? AND sid = ?", [room, sid]
+        )
+        return self.count(room)
+
+    def rooms(self, sid):
+        return [
+            row["room"]
+            for row in self._connect().execute(
+                "SELECT room FROM room_members WHERE sid = ?", [sid]
+            )
+        ]
+
+    def count(self, room):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM room_members WHERE room = ?", [room]
+        ).fetchone()[0]
+
+    def counts(self):
+        """Participantes de cada sala con alguno."""
+        rows = self._connect().execute(
+            "SELECT room, COUNT(*) AS n FROM room_members GROUP BY room"
+        )
+        return {row["room"]: row["n"] for row in rows}
+
+    def recover(self):
+        """Elimina los participantes de procesos que ya no existen.
+
+        Los procesos se identifican por pid y hora de arranque, así que se
+        eliminan también los de un proceso anterior con el mismo pid.
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT DISTINCT pid, started FROM room_members"
+        ).fetchall()
+        for row in rows:
+            if not db.alive(row["pid"], row["started"]):
+                conn.execute(
+                    "DELETE FROM room_members WHERE pid = ? AND started IS ?",
+                    [row["pid"], row["started"]],
+                )
@@ -0,0 +1,122 @@
+import logging
+import time
+
+import batches
+import jobqueue
+import metrics
+from work import Work
+from workers import Worker
+
+
+POLL_INTERVAL = 1
+
+log = logging.getLogger("socketio.server")
+
+
+class Scheduler:
+    """Ejecuta los procesos en cola con un número limitado de huecos.
+
+    Cada hueco mantiene un Worker con QGIS ya inicializado, de modo que los
+    trabajos no pagan el arranque en frío. Los huecos sin procesos en cola
+    hacen la precarga de la caché de prewarmer.
+    """
+
+    def __init__(
+        self, socketio, workers=1, capacity=None, max_jobs=20, max_rss=None,
+        prewarmer=None,
+    ):
+        self.socketio = socketio
+        self.workers = workers
+        self.capacity = capacity
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss or float("inf")
+        self.prewarmer = prewarmer
+
+    def start(self):
+        for item in jobqueue.recover():
+            batches.finish(item)
+        for __ in range(self.workers):
+            self.socketio.start_background_task(self._slot)
+        self.socketio.start_background_task(self._feed)
+
+    def submit(self, mun_code, split, user, args, priority=0):
+        """Encola un proceso. Ver jobqueue.push."""
+        params = {"user": user, "args": args}
+        return jobqueue.push(mun_code, split, params, priority, self.capacity)
+
+    def _feed(self):
+        """Encola los elementos de los lotes a medida que hay huecos.
+
+        Mantiene un elemento en espera por hueco para que los procesos de
+        trabajo, con QGIS ya inicializado, no queden parados entre uno y
+        otro.
+        """
+        while True:
+            try:
+                for item in batches.feed(self.workers):
+                    data = dict(**item["user"], room=item["mun_code"])
+                    self.socketio.emit("createJob", data, to=item["mun_code"])
+            except Exception:
+                log.exception("Error encolando lotes de procesos")
+            self.socketio.sleep(POLL_INTERVAL)
+
+    def _spawn(self):
+        return Worker(self.max_jobs, self.max_rss)
+
+    def _slot(self):
+        worker = self._spawn()
+        while True:
+            item = jobqueue.claim()
+            mun_code = None
+            if item is None and self.prewarmer:
+                try:
+                    mun_code = self.prewarmer.take()
+                except Exception:
+                    log.exception("Error buscando municipios que precargar")
+            if item is None and mun_code is None:
+                self.socketio.sleep(POLL_INTERVAL)
+                continue
+            if not worker.is_alive():
+                worker.stop(self.socketio)
+                worker = self._spawn()
+            if item is None:
+                if self.prewarmer.fetch(worker, mun_code):
+                    worker.stop(self.socketio)
+                    worker = self._spawn()
+                continue
+            stats = None
+            try:
+                stats = self._run(worker, item)
+            except Exception:
+                log.exception(f"Error procesando {item['mun_code']}")
+            finally:
+                jobqueue.remove(item["id"])
+                try:
+                    batches.finish(item)
+                except Exception:
+                    log.exception(f"Error actualizando el lote de {item['mun_code']}")
+            if not stats or stats["recycle"]:
+                worker.stop(self.socketio)
+                worker = self._spawn()
+
+    def _run(self, worker, item):
+        mun_code = item["mun_code"]
+        user = item["params"]["user"]
+        args = item["params"]["args"]
+        job = Work(mun_code, item["split"], user, **args, socketio=self.socketio)
+        job.events = worker.conn
+        sent = time.time()
+        worker.send(mun_code, item["split"], user, args)
+        try:
+            stats = job.watch_log(user)
+        except Exception:
+            job.fail("Error siguiendo el proceso")
+            raise
+        if stats:
+            metrics.observe_job(stats)
+        if job.first_log:
+            elapsed = job.first_log - sent
+            log.info(f"{mun_code}: primera línea de registro en {elapsed:.2f}s")
+        if stats is None:
+            log.error(f"{mun_code}: el proceso de trabajo terminó inesperadamente")
+        return stats
@@ -1,4 +1,6 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
+
+import jobcatalog
 
 class JobConfigSchema(Schema):
     language = fields.Str()
@@ -10,3 +12,32 @@ class JobSchema(Schema):
     building = fields.Bool()
     address = fields.Bool()
     config = fields.Nested(JobConfigSchema())
+
+class JobPollSchema(JobSchema):
+    # Versiones de las secciones que ya tiene el cliente: "informe:abc,..."
+    versiones = fields.Str()
+
+class BatchItemSchema(Schema):
+    cod_municipio = fields.Str(required=True)
+    cod_division = fields.Str()
+
+class BatchSchema(Schema):
+    # Una provincia completa o una lista de municipios y divisiones
+    prov = fields.Str()
+    items = fields.List(fields.Nested(BatchItemSchema()))
+    building = fields.Bool()
+    address = fields.Bool()
+    config = fields.Nested(JobConfigSchema())
+
+class JobListSchema(Schema):
+    status = fields.Str()
+    user = fields.Str()
+    prov = fields.Str()
+    sort = fields.Str(validate=validate.OneOf(jobcatalog.SORT_FIELDS))
+    desc = fields.Bool()
+    offset = fields.Integer(validate=validate.Range(min=0))
+    limit = fields.Integer(validate=validate.Range(min=1))
+
+class ChatSchema(Schema):
+    offset = fields.Integer(validate=validate.Range(min=0))
+    limit = fields.Integer(validate=validate.Range(min=1, max=500))
@@ -0,0 +1,73 @@
+import pickle
+import time
+
+import socketio
+
+import db
+
+
+POLL_INTERVAL = 0.05
+MAX_AGE = 60  # Segundos que se guardan los mensajes ya repartidos
+PURGE_EVERY = 100
+
+
+def _table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS socketio_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            data BLOB NOT NULL,
+            created REAL NOT NULL
+        )
+        """
+    )
+
+
+def _connect():
+    return db.connect(_table)
+
+
+class SqliteManager(socketio.PubSubManager):
+    """Cola de mensajes de Socket.IO en la base de datos compartida.
+
+    Permite varios procesos de la API en la misma máquina sin un servidor
+    de colas: cada proceso publica sus eventos en una tabla y reparte a sus
+    clientes los que publican los demás.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, channel="socketio", write_only=False, logger=None):
+        super().__init__(channel, write_only, logger)
+        self.published = 0
+
+    def _publish(self, data):
+        conn = _connect()
+        conn.execute(
+            "INSERT INTO socketio_queue (channel, data, created) VALUES (?, ?, ?)",
+            [self.channel, pickle.dumps(data), time.time()],
+        )
+        self.published += 1
+        if self.published % PURGE_EVERY == 0:
+            conn.execute(
+                "DELETE FROM socketio_queue WHERE created < ?",
+                [time.time() - MAX_AGE],
+            )
+
+    def _listen(self):
+        conn = _connect()
+        last = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM socketio_queue"
+        ).fetchone()[0]
+        while True:
+            rows = conn.execute(
+                "SELECT id, data FROM socketio_queue "
+                "WHERE channel = ? AND id > ? ORDER BY id",
+                [self.channel, last],
+            ).fetchall()
+            for row in rows:
+                last = row["id"]
+                yield row["data"]
+            if not rows:
+                self.server.sleep(POLL_INTERVAL)
@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import boundarycache
+
+
+TTL = 24 * 60 * 60
+RETRY = 10 * 60  # Espera tras un error antes de volver a consultar
+
+log = logging.getLogger("socketio.server")
+
+_lock = threading.Lock()
+_flights = {}
+
+
+class _Flight:
+    """Consulta en curso de los distritos de un municipio."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _fetch(mun_code, fp):
+    divisiones = [
+        {
+            "osm_id": district[1],
+            "nombre": f"{'  ' if district[0] else ''}{district[2]} {district[3]}",
+        }
+        for district in boundarycache.get_districts(mun_code)
+    ]
+    tmp = fp + ".tmp"
+    with open(tmp, "w") as fo:
+        json.dump(divisiones, fo)
+    os.replace(tmp, fp)
+    return divisiones
+
+
+def _run(mun_code, fp, flight):
+    try:
+        flight.result = _fetch(mun_code, fp)
+    except Exception as e:
+        flight.error = e
+        log.exception(f"Error obteniendo los distritos de {mun_code}")
+        if os.path.exists(fp):
+            retry = time.time() - TTL + RETRY
+            os.utime(fp, (retry, retry))
+    finally:
+        with _lock:
+            _flights.pop(mun_code, None)
+        flight.done.set()
+
+
+def refresh(mun_code, fp, wait=True):
+    """Consulta los distritos y actualiza fp.
+
+    Solo hay una consulta en curso por municipio: las llamadas simultáneas
+    esperan a la misma. Con wait=False se hace en segundo plano.
+    """
+    with _lock:
+        flight = _flights.get(mun_code)
+        owner = flight is None
+        if owner:
+            flight = _flights[mun_code] = _Flight()
+    if owner:
+        if wait:
+            _run(mun_code, fp, flight)
+        else:
+            threading.Thread(
+                target=_run, args=(mun_code, fp, flight), daemon=True
+            ).start()
+    if wait:
+        flight.done.wait()
+        if flight.error:
+            raise flight.error
+        return flight.result
+
+
+def get(mun_code, fp, ttl=TTL):
+    """Distritos de un municipio guardados en fp.
+
+    Si la copia ha caducado se devuelve igualmente y se actualiza en
+    segundo plano. Si no existe se consulta y se espera al resultado.
+    """
+    if not os.path.exists(fp):
+        return refresh(mun_code, fp)
+    with open(fp, "r") as fo:
+        divisiones = json.load(fo)
+    if time.time() - os.path.getmtime(fp) > ttl:
+        refresh(mun_code, fp, wait=False)
+    return divisiones
@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+
+import pytest
+
+# Los módulos de la API leen HOME al importarse
+os.environ["HOME"] = tempfile.mkdtemp(prefix="catatom-test-")
+for fn in ["results", "cache"]:
+    os.makedirs(os.path.join(os.environ["HOME"], fn))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import boundarycache  # noqa: E402
+from work import WORK_DIR  # noqa: E402
+
+USER = {"osm_id": "1", "username": "test"}
+
+
+class FakeSocketIO:
+    server = types.SimpleNamespace(eio=types.SimpleNamespace(async_mode="threading"))
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, data, to=None):
+        self.events.append((event, data, to))
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+@pytest.fixture
+def socketio():
+    return FakeSocketIO()
+
+
+@pytest.fixture
+def started_job():
+    """Crea la carpeta de un proceso iniciado por USER."""
+
+    def create(mun_code):
+        boundarycache._connect().execute(
+            "INSERT OR REPLACE INTO boundary_cache VALUES (?, ?, ?, ?)",
+            ["municipality", mun_code, json.dumps([1, mun_code]), time.time()],
+        )
+        path = os.path.join(WORK_DIR, mun_code)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "user.json"), "w") as fo:
+            json.dump(USER, fo)
+        return path
+
+    return create
@@ -0,0 +1,47 @@
+import os
+import time
+
+import pytest
+
+import jobqueue
+from conftest import USER
+from work import Work
+
+api = pytest.importorskip("api")
+
+
+@pytest.fixture
+def client():
+    return api.app.test_client()
+
+
+def test_export_range(client, started_job):
+    started_job("11005")
+    job = Work("11005", user=USER)
+    tasks = job._path(job.target_dir, job.tasks_dir)
+    os.makedirs(tasks, exist_ok=True)
+    with open(os.path.join(tasks, "1.osm.gz"), "wb") as fo:
+        fo.write(os.urandom(1000))
+    full = client.get("/export/11005")
+    assert full.status_code == 200
+    size = len(full.data)
+    assert full.headers["Content-Length"] == str(size)
+    part = client.get("/export/11005", headers={"Range": "bytes=0-9"})
+    assert part.status_code == 206
+    assert part.headers["Content-Length"] == "10"
+    assert part.headers["Content-Range"] == f"bytes 0-9/{size}"
+    assert part.data == full.data[:10]
+
+
+def test_province_changes_when_queue_changes(client):
+    first = client.get("/prov/02")
+    assert first.status_code == 200
+    time.sleep(1)  # Last-Modified tiene precisión de segundos
+    jobqueue.push("02001", None, {"user": USER, "args": {}})
+    try:
+        headers = {"If-Modified-Since": first.headers["Last-Modified"]}
+        again = client.get("/prov/02", headers=headers)
+        assert again.status_code == 200
+        assert again.headers["Last-Modified"] != first.headers["Last-Modified"]
+    finally:
+        jobqueue.cancel("02001")
@@ -0,0 +1,27 @@
+import batches
+import jobqueue
+from conftest import USER
+from work import Work
+
+
+def test_finished_item_is_terminal(started_job):
+    started_job("11003")
+    batch_id = batches.create(USER, [("11003", None)], {})
+    assert [item["mun_code"] for item in batches.feed(1)] == ["11003"]
+    item = jobqueue.claim()
+    assert batches.get(batch_id)["elementos"][0]["estado"] == "RUNNING"
+    Work("11003", user=USER).fail("Error de prueba")
+    jobqueue.remove(item["id"])
+    batches.finish(item)
+    # El estado se guarda y ya no depende del catálogo
+    Work("11003", user=USER).delete()
+    batch = batches.get(batch_id)
+    assert batch["elementos"][0]["estado"] == "ERROR"
+    assert batch["terminados"] == 1 and batch["progreso"] == 1
+
+
+def test_finish_ignores_jobs_outside_batches(started_job):
+    started_job("11004")
+    batch_id = batches.create(USER, [("11004", None)], {})
+    batches.finish({"mun_code": "11004", "split": None, "params": {}})
+    assert batches.get(batch_id)["elementos"][0]["estado"] == "PENDING"
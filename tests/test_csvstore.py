@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+
+from csvstore import CsvStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / "rows.csv").write_text("a\t1\nb\t2\n")
+    store = CsvStore("rows.csv")
+    connect = store.connect
+
+    def quick(path):
+        conn = connect(path)
+        conn.execute("PRAGMA busy_timeout = 10")
+        return conn
+
+    store.connect = quick
+    return store
+
+
+def test_update(store, tmp_path):
+    assert store.update(str(tmp_path), "a", lambda fields: ["3"]) == ["3"]
+    assert store.get(str(tmp_path), "a") == ["3"]
+    with pytest.raises(ValueError):
+        store.update(str(tmp_path), "b", lambda fields: int("x"))
+    assert store.get(str(tmp_path), "b") == ["2"]
+
+
+def test_update_locked_reports_lock(store, tmp_path):
+    other = store.connect(str(tmp_path))
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            store.update(str(tmp_path), "a", lambda fields: ["3"])
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
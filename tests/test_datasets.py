@@ -0,0 +1,51 @@
+import os
+import zipfile
+
+import datasets
+import workspace
+
+
+def make_dataset(path, name, size=1000):
+    fp = os.path.join(path, name)
+    with zipfile.ZipFile(fp, "w") as zf:
+        zf.writestr(zipfile.ZipInfo("a.gml", (2026, 1, 1, 0, 0, 0)), os.urandom(size))
+    return fp
+
+
+def test_place_keeps_linked_copies(tmp_path):
+    src = make_dataset(tmp_path, "A.ES.SDGC.BU.11111.zip")
+    linked = str(tmp_path / "linked.zip")
+    os.link(src, linked)
+    other = make_dataset(tmp_path, "other.zip", 2000)
+    # Sustituir src no modifica el inodo que comparte con linked
+    workspace.place(other, src)
+    assert os.path.getsize(linked) != os.path.getsize(src)
+    assert zipfile.ZipFile(linked).testzip() is None
+    assert not [fn for fn in os.listdir(tmp_path) if fn.endswith(".tmp")]
+
+
+def test_ingest_over_quota_keeps_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(datasets, "QUOTA", 100)
+    fp = make_dataset(tmp_path, "A.ES.SDGC.BU.11112.zip")
+    assert datasets.ingest(fp) is None
+    assert os.path.exists(fp)
+    monkeypatch.setattr(datasets, "QUOTA", 1024 * 1024)
+    assert datasets.ingest(fp) == "A.ES.SDGC.BU.11112.20260101000000"
+
+
+def test_repeated_download_stays_seedable(tmp_path):
+    fp = make_dataset(tmp_path, "A.ES.SDGC.BU.11113.zip")
+    k = datasets.ingest(fp)
+    old = datasets.MAX_AGE + 60
+    datasets._connect().execute(
+        "UPDATE datasets SET added = added - ? WHERE key = ?", [old, k]
+    )
+    job = tmp_path / "job"
+    job.mkdir()
+    assert datasets.seed("11113", str(job)) == []
+    # Catastro publica el mismo contenido otra vez
+    again = tmp_path / "again"
+    again.mkdir()
+    fp = make_dataset(str(again), "A.ES.SDGC.BU.11113.zip")
+    assert datasets.ingest(fp) == k
+    assert datasets.seed("11113", str(job)) == ["A.ES.SDGC.BU.11113"]
@@ -0,0 +1,25 @@
+import threading
+
+import db
+
+
+def test_connection_per_thread(tmp_path):
+    main = db.connect()
+    main.execute("BEGIN IMMEDIATE")
+    other = []
+
+    def run():
+        conn = db.connect()
+        other.append(conn)
+        # No ve la transacción abierta del hilo principal
+        assert not conn.in_transaction
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    main.execute("COMMIT")
+    assert other[0] is not main
+    assert db.connect() is main
+    # La conexión del hilo terminado se cierra al crear otra
+    db.connect(path=str(tmp_path / "other.db"))
+    assert not any(conn is other[0] for conn, __ in db._connections.values())
@@ -0,0 +1,18 @@
+import os
+import zipfile
+
+import exports
+
+
+def test_archive_survives_concurrent_removal(tmp_path):
+    tasks = tmp_path / "12345" / "tasks"
+    tasks.mkdir(parents=True)
+    (tasks / "1.osm.gz").write_bytes(b"data")
+    fo, etag = exports.archive(str(tmp_path), "12345/tasks")
+    # Otra exportación lo sustituye mientras se envía
+    os.remove(fo.name)
+    assert zipfile.ZipFile(fo).namelist() == ["12345/tasks/1.osm.gz"]
+    fo.close()
+    fo, again = exports.archive(str(tmp_path), "12345/tasks")
+    assert again == etag and zipfile.ZipFile(fo).testzip() is None
+    fo.close()
@@ -0,0 +1,29 @@
+import jobqueue
+
+
+def test_recover_keeps_running_jobs():
+    jobqueue.push("38002", None, {})
+    item = jobqueue.claim()
+    assert jobqueue.recover() == []
+    jobqueue.remove(item["id"])
+
+
+def test_recover_drops_jobs_of_previous_process_with_same_pid():
+    jobqueue.push("38001", None, {})
+    item = jobqueue.claim()
+    # Tras reiniciar el contenedor la API tiene el mismo pid
+    jobqueue._connect().execute(
+        "UPDATE job_queue SET started = started - 60 WHERE id = ?", [item["id"]]
+    )
+    assert [row["mun_code"] for row in jobqueue.recover()] == ["38001"]
+    assert jobqueue.push("38001", None, {}) is not None
+    assert jobqueue.cancel("38001")
+
+
+def test_last_modified_follows_queue_changes():
+    before = jobqueue.last_modified("38")
+    jobqueue.push("38004", None, {})
+    pushed = jobqueue.last_modified("38")
+    assert pushed > before
+    assert jobqueue.cancel("38004")
+    assert jobqueue.last_modified("38") >= pushed
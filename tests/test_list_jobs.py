@@ -0,0 +1,35 @@
+import jobqueue
+import municipalities
+from conftest import USER
+from work import Work
+
+
+def test_queued_filter_includes_jobs_without_catalog_entry():
+    jobqueue.push("38001", None, {"user": USER, "args": {}})
+    try:
+        total, data = Work.list_jobs(status="QUEUED", prov="38")
+        assert total == 1
+        assert data[0]["mun_code"] == "38001"
+        assert data[0]["name"] == municipalities.name("38001")
+        assert data[0]["status"] == "QUEUED"
+        assert data[0]["user"] == USER["username"]
+    finally:
+        jobqueue.cancel("38001")
+
+
+def test_status_filter_excludes_queued_jobs(started_job):
+    started_job("11006")
+    job = Work("11006", user=USER)
+    job.fail("Error de prueba")
+    total, data = Work.list_jobs(status="ERROR", prov="11")
+    assert "11006" in [row["mun_code"] for row in data]
+    jobqueue.push("11006", None, {"user": USER, "args": {}})
+    try:
+        again, data = Work.list_jobs(status="ERROR", prov="11")
+        assert again == total - 1
+        assert "11006" not in [row["mun_code"] for row in data]
+        assert all(row["status"] == "ERROR" for row in data)
+        total, data = Work.list_jobs(status="QUEUED", prov="11")
+        assert [row["mun_code"] for row in data] == ["11006"]
+    finally:
+        jobqueue.cancel("11006")
@@ -0,0 +1,58 @@
+import os
+import time
+
+import pytest
+
+import db
+import leases
+import prewarm
+
+
+def hold(name, pid, started, expires):
+    leases._connect().execute(
+        "INSERT OR REPLACE INTO leases (name, pid, expires, started) "
+        "VALUES (?, ?, ?, ?)",
+        [name, pid, expires, started],
+    )
+
+
+def test_lease_is_held_by_one_process():
+    # Otro proceso en marcha: el proceso padre
+    other = os.getppid()
+    hold("test", other, db.started(other), time.time() + 60)
+    assert not leases.acquire("test", 60)
+    hold("test", other, db.started(other), time.time() - 1)
+    assert leases.acquire("test", 60)
+    assert leases.acquire("test", 60)
+
+
+def test_lease_of_previous_process_with_same_pid():
+    # Tras reiniciar el contenedor la API tiene el mismo pid
+    hold("test", os.getpid(), db.started() - 60, time.time() + 60)
+    assert leases.acquire("test", 60)
+
+
+def test_prewarmer_waits_without_lease(socketio):
+    other = os.getppid()
+    hold(prewarm.LEASE, other, db.started(other), time.time() + 60)
+    prewarmer = prewarm.Prewarmer(socketio)
+    prewarmer._queue.append("11001")
+    assert prewarmer.take() is None
+    assert prewarmer.counters["passes"] == 0
+
+
+def test_prewarmer_uses_at_most_workers_slots(socketio):
+    leases._connect().execute("DELETE FROM leases")
+    prewarmer = prewarm.Prewarmer(socketio, workers=1, interval=0)
+    prewarmer._last_pass = time.time()
+    prewarmer._queue.extend(["11001", "11002"])
+    assert prewarmer.take() == "11001"
+    assert prewarmer.take() is None
+    prewarmer.busy -= 1
+    assert prewarmer.take() == "11002"
+
+
+def test_in_thread(socketio):
+    assert prewarm._in_thread(socketio, pow, 2, 3) == 8
+    with pytest.raises(ZeroDivisionError):
+        prewarm._in_thread(socketio, divmod, 1, 0)
@@ -0,0 +1,15 @@
+import rooms
+
+
+def test_recover_drops_members_of_previous_process_with_same_pid():
+    shared = rooms.SharedRooms()
+    assert shared.joined("a", "38003") == 1
+    shared.recover()
+    assert shared.count("38003") == 1
+    # Tras reiniciar el contenedor la API tiene el mismo pid
+    shared._connect().execute(
+        "UPDATE room_members SET started = started - 60 WHERE sid = 'a'"
+    )
+    assert shared.joined("b", "38003") == 2
+    shared.recover()
+    assert shared.rooms("a") == [] and shared.count("38003") == 1
@@ -0,0 +1,48 @@
+import os
+from multiprocessing import Pipe
+
+from catatom2osm.exceptions import CatValueError
+
+import jobcatalog
+import work
+from conftest import USER
+from work import Work
+
+
+def catalog_status(mun_code):
+    __, rows = jobcatalog.query(mun_codes=[mun_code])
+    return rows[0]["status"]
+
+
+def test_worker_crash_marks_job_error(socketio, started_job):
+    started_job("11001")
+    job = Work("11001", user=USER, socketio=socketio)
+    job._refresh()
+    assert catalog_status("11001") == "RUNNING"
+    conn, child_conn = Pipe()
+    child_conn.close()  # El proceso de trabajo muere sin enviar "end"
+    job.events = conn
+    assert job.watch_log(USER) is None
+    assert catalog_status("11001") == "ERROR"
+    assert Work.get_status("11001") == Work.Status.ERROR
+    event, data, room = socketio.events[-1]
+    assert event == "done" and data["job"]["estado"] == "ERROR"
+
+
+def test_fail_marks_job_error(started_job):
+    started_job("11002")
+    job = Work("11002", user=USER)
+    job.fail("Error de prueba")
+    assert catalog_status("11002") == "ERROR"
+
+
+def test_run_restores_working_directory(started_job, monkeypatch):
+    started_job("11007")
+
+    def create_and_run(path, options):
+        raise CatValueError("Error de prueba")
+
+    monkeypatch.setattr(work.CatAtom2Osm, "create_and_run", create_and_run)
+    cwd = os.getcwd()
+    Work("11007", user=USER).run()
+    assert os.getcwd() == cwd
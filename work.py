@@ -1,6 +1,7 @@
 import argparse
 import glob
 import gzip
+import hashlib
 import json
 import logging
 import os
@@ -11,27 +12,41 @@ import time
 from telnetlib import STATUS
 import time
 from enum import Enum, auto
-from functools import wraps
-from multiprocessing import Process
+from functools import cached_property, wraps
 
 from tempfile import mkstemp
 from flask import g
 from flask_restful import abort
 from werkzeug.utils import secure_filename
 
-from catatom2osm import boundary
 from catatom2osm import csvtools
 from catatom2osm import config as cat_config
-from catatom2osm import osmxml
-from catatom2osm.app import CatAtom2Osm, QgsSingleton
-from catatom2osm.boundary import get_districts
+from catatom2osm.app import CatAtom2Osm
 from catatom2osm.exceptions import CatValueError
 
+import addressindex
+import boundarycache
+import chatlog
+import datasets
+import events
+import exports
+import fixmes
+import highwaynames
+import jobcatalog
+import jobindex
+import jobqueue
+import logtail
+import metrics
+import municipalities
+import splits
+import workspace
+
 
 WORK_DIR = os.path.join(os.environ['HOME'], 'results')
-BACKUP_DIR = os.path.join(os.environ['HOME'], 'backup')
 CACHE_DIR = os.path.join(os.environ['HOME'], 'cache')
-FIXME_LOCK_TIMEOUT = 24 * 60 * 60 # 1 day
+# Secciones de get_dict que solo se envían si han cambiado
+SECTIONS = ["informe", "report", "callejero", "revisar", "info"]
+FIXME_LOCK_TIMEOUT = fixmes.LOCK_TIMEOUT
 
 dict2csv = csvtools.dict2csv
  
@@ -50,7 +65,7 @@ def check_owner(f):
     return decorated_function
 
 
-class Work(Process):
+class Work:
 
     class Status(Enum):
         AVAILABLE = auto()
@@ -59,6 +74,7 @@ class Work(Process):
         REVIEW = auto()
         FIXME = auto()
         ERROR = auto()
+        QUEUED = auto()
 
     def __init__(
         self,
@@ -71,19 +87,28 @@ class Work(Process):
         config={},
         socketio=None,
     ):
-        super(Work, self).__init__()
         self.mun_code = mun_code
         self.user = user
-        self.split = split
         self.linea = linea
         self.config = config
         self.socketio = socketio
+        self.events = None
+        self.first_log = None
         self.path = os.path.join(WORK_DIR, self.mun_code)
-        self.options = argparse.Namespace(
-            path = [mun_code],
+        self._split = split
+        self._building = building
+        self._address = address
+        self._options = None
+
+    def _load(self):
+        """Lee el informe y las opciones del proceso la primera vez que se usan."""
+        if self._options is not None:
+            return
+        self._options = argparse.Namespace(
+            path = [self.mun_code],
             args = "",
-            address=address,
-            building=building,
+            address=self._address,
+            building=self._building,
             comment=False,
             config_file=False,
             download=False,
@@ -93,20 +118,54 @@ class Work(Process):
             zoning=False,
             municipality=False,
             list="",
-            split=self.split,
+            split=self._split,
             parcel=[],
             log_level='INFO',
         )
-        self.options.args = self.current_args
-        self.options.args += (" " if self.options.args else "") +  mun_code
-        self.report = self.search_report()
-        self.get_options_from_report(self.report)
-        if self.split:
-            self.options.args += f" -s {self.split}"
-        self.osm_id, self.name = boundary.get_municipality(mun_code)
+        self._options.args = self.current_args
+        self._options.args += (" " if self._options.args else "") +  self.mun_code
+        self._report = self.search_report()
+        self.get_options_from_report(self._report)
+        if self._split:
+            self._options.args += f" -s {self._split}"
+
+    @property
+    def options(self):
+        self._load()
+        return self._options
+
+    @property
+    def report(self):
+        self._load()
+        return self._report
+
+    @property
+    def report_path(self):
+        self._load()
+        return self._report_path
+
+    @property
+    def split(self):
+        self._load()
+        return self._split
+
+    @cached_property
+    def _municipality(self):
+        return boundarycache.get_municipality(self.mun_code)
+
+    @property
+    def osm_id(self):
+        return self._municipality[0]
+
+    @property
+    def name(self):
+        return self._municipality[1]
 
     @staticmethod
     def get_user(mun_code):
+        user = jobqueue.owner(mun_code)
+        if user:
+            return user
         fn = os.path.join(WORK_DIR, mun_code)
         if os.path.exists(fn):
             fn = os.path.join(fn, "user.json")
@@ -114,22 +173,34 @@ class Work(Process):
                 with open(fn, "r") as fo:
                     return json.load(fo)
 
+    @staticmethod
+    def get_status(mun_code, split=None):
+        """Estado de Work(mun_code, split) sin construirlo."""
+        if jobqueue.position(mun_code):
+            return Work.Status.QUEUED
+        if split:
+            return Work.Status[jobindex.split_status(mun_code, split)]
+        return Work.Status[jobindex.default_status(mun_code)]
+
     @staticmethod
     def validate(mun_code, split=None, **kwargs):
         user = getattr(g, "user_data", "")
         try:
-            job = Work(mun_code, split, user, **kwargs)
+            with metrics.timed("catatom_operation_seconds", op="work"):
+                job = Work(mun_code, split, user, **kwargs)
+                job.osm_id  # Comprueba que el municipio existe
         except CatValueError as e:
             abort(404, message=str(e))
         return job
 
     @staticmethod
-    def _get_fixme_dict(k, v):
+    def _get_fixme_dict(k, v, active=None):
         locked = v[3] if len(v) > 3 else None
         if locked:
-            lapse = FIXME_LOCK_TIMEOUT + 1 if locked == 'true' else time.time() - float(v[3])
-            if lapse > FIXME_LOCK_TIMEOUT:
-                v = v[0]
+            if active is None:
+                active = fixmes.locked_until(v) > time.time()
+            if not active:
+                v = v[:1]
                 locked = None
         return {
             "filename": k + ".osm.gz",
@@ -140,45 +211,108 @@ class Work(Process):
         }
 
     @staticmethod
-    def list_jobs():
-        data = []
-        for fp in sorted(glob.glob(os.path.join(WORK_DIR, "?????"))):
-            fn = os.path.join(fp, "user.json")
-            if os.path.exists(fn):
-                mun_code = os.path.basename(fp)
-                job = Work(mun_code)
-                user = Work.get_user(mun_code)
-                row = {
-                    "mun_code": mun_code,
-                    "name": job.name,
-                    "split_id": None,
-                    "split_name": "",
-                    "user": user["username"]
-                }
-                divs = []
-                for split in os.listdir(job.path):
-                    if (
-                        os.path.isdir(job._path(split))
-                        and split != "backup"
-                        and not split.startswith("tasks")
-                    ):
-                        div = Work(mun_code, split)
-                        row["split_id"] = split
-                        row["split_name"] = div.report["split_name"]
-                        row["status"] = div.status.name
-                        row["tasks"] = div.report.get("tasks", 0)
-                        row["parts"] = div.report.get("out_parts", 0)
-                        row["address"] = div.report.get("out_address", 0)
-                        divs.append(dict(row))
-                if divs:
-                    data.extend(sorted(divs, key=lambda div: div["split_name"]))
-                else:
-                    row["status"] =  job.status.name
-                    row["tasks"] = job.report.get("tasks", 0)
-                    row["parts"] = job.report.get("out_parts", 0)
-                    row["address"] = job.report.get("out_address", 0)
-                    data.append(row)
-        return data
+    def catalog_rows(mun_code):
+        """Entradas del catálogo de procesos de un municipio."""
+        fn = os.path.join(WORK_DIR, mun_code, "user.json")
+        if not os.path.exists(fn):
+            return []
+        job = Work(mun_code)
+        with open(fn, "r") as fo:
+            user = json.load(fo)
+        row = {
+            "mun_code": mun_code,
+            "name": job.name,
+            "split_id": None,
+            "split_name": "",
+            "user": user["username"]
+        }
+        divs = []
+        for split in os.listdir(job.path):
+            if (
+                os.path.isdir(job._path(split))
+                and split != "backup"
+                and not split.startswith("tasks")
+            ):
+                div = Work(mun_code, split)
+                row["split_id"] = split
+                row["split_name"] = div.report.get("split_name", "")
+                row["status"] = div.status.name
+                row["tasks"] = div.report.get("tasks", 0)
+                row["parts"] = div.report.get("out_parts", 0)
+                row["address"] = div.report.get("out_address", 0)
+                divs.append(dict(row))
+        if divs:
+            return sorted(divs, key=lambda div: div["split_name"])
+        row["status"] =  job.status.name
+        row["tasks"] = job.report.get("tasks", 0)
+        row["parts"] = job.report.get("out_parts", 0)
+        row["address"] = job.report.get("out_address", 0)
+        return [row]
+
+    @staticmethod
+    def update_catalog(mun_code):
+        jobcatalog.replace(mun_code, Work.catalog_rows(mun_code))
+
+    @staticmethod
+    def list_jobs(status=None, **kwargs):
+        """Número total y página de procesos del catálogo."""
+        if status == Work.Status.QUEUED.name:
+            return Work._list_queued(**kwargs)
+        if status:
+            # En el catálogo figuran con su estado anterior
+            kwargs["exclude"] = jobqueue.queued()
+        total, data = jobcatalog.query(status=status, **kwargs)
+        for row in data:
+            if jobqueue.position(row["mun_code"]):
+                row["status"] = Work.Status.QUEUED.name
+        return total, data
+
+    @staticmethod
+    def _list_queued(
+        user=None, prov=None, sort="mun_code", desc=False, offset=0, limit=None
+    ):
+        """Como list_jobs para los procesos en cola.
+
+        Incluye los municipios que se procesan por primera vez y aún no
+        tienen entrada en el catálogo. La cola es corta, así que se filtra
+        y ordena aquí.
+        """
+        items = jobqueue.waiting_items()
+        mun_codes = [item["mun_code"] for item in items]
+        __, rows = jobcatalog.query(mun_codes=mun_codes)
+        known = {row["mun_code"] for row in rows}
+        for item in items:
+            if item["mun_code"] not in known:
+                rows.append(
+                    {
+                        "mun_code": item["mun_code"],
+                        "name": municipalities.name(item["mun_code"]),
+                        "split_id": item["split"] or None,
+                        "split_name": "",
+                        "user": item["params"]["user"]["username"],
+                        "tasks": 0,
+                        "parts": 0,
+                        "address": 0,
+                    }
+                )
+        rows = [
+            dict(row, status=Work.Status.QUEUED.name)
+            for row in rows
+            if (not user or row["user"] == user)
+            and (not prov or row["mun_code"].startswith(prov))
+        ]
+        field = sort if sort != "updated" else "mun_code"
+        rows.sort(key=lambda row: (row["mun_code"], row["split_name"]))
+        rows.sort(
+            key=lambda row: "" if row[field] is None else row[field], reverse=desc
+        )
+        end = None if limit is None else offset + limit
+        return len(rows), rows[offset:end]
+
+    def _refresh(self):
+        """Actualiza el índice de estado y el catálogo tras un cambio."""
+        jobindex.refresh(self.mun_code)
+        Work.update_catalog(self.mun_code)
 
     def _path(self, *args):
         return os.path.join(self.path, *args)
@@ -202,44 +336,36 @@ class Work(Process):
         return False
 
     def _get_file(self, *args, from_row=0):
-        fn = self._path(*args)
-        rows = []
-        i = 0
-        if os.path.exists(fn):
-            with open(fn, "r") as fo:
-                for row in fo.readlines():
-                    if i >= from_row:
-                        rows.append(row.strip("\n"))
-                    i += 1
-        return rows, i
+        return logtail.read_from(self._path(*args), from_row)
 
     def _read_cache(self):
         self._path_create()
         cache = os.path.join(CACHE_DIR, self.mun_code)
         if self.status == Work.Status.AVAILABLE and os.path.exists(cache):
-            shutil.copytree(cache, self.path, dirs_exist_ok=True)
+            datasets.import_dir(cache)
+            workspace.place_tree(cache, self.path, link=workspace.is_dataset)
+        datasets.seed(self.mun_code, self.path)
 
     def _backup_files(self):
-        backup = os.path.join(BACKUP_DIR, self.mun_code)
-        if not os.path.exists(backup):
-            os.mkdir(backup)
-        for fp in glob.iglob(self._path("A.ES.SDGC.??.?????.zip")):
-            fn = os.path.basename(fp)
-            shutil.move(fp, os.path.join(backup, fn))
+        for fp in glob.iglob(self._path(workspace.DATASET)):
+            # Si no se ha podido guardar en el almacén se conserva aquí
+            if datasets.ingest(fp):
+                os.remove(fp)
         backup = self._path_create("backup")
         if self._path_exists("highway_names.csv"):
-            shutil.copy(self._path("highway_names.csv"), backup)
+            workspace.place(self._path("highway_names.csv"), backup)
         if self._path_exists("review.txt"):
-            shutil.copy(self._path("review.txt"), backup)
+            workspace.place(self._path("review.txt"), backup)
             review = csv2dict(self._path("review.txt"))
             for fixme in review.keys():
                 fn = fixme + ".osm.gz"
                 src = self._path(self.target_dir, self.tasks_dir, fn)
                 dst = self._path("backup", fn)
-                shutil.copy(src, dst)
+                workspace.place(src, dst)
         if self._path_exists(self.target_dir, self.tasks_dir):
             dst = self._path(self.target_dir, self.tasks_dir, "backup")
-            shutil.copytree(backup, dst, dirs_exist_ok=True)
+            # Las copias de backup solo se sustituyen, nunca se modifican
+            workspace.place_tree(backup, dst, link=lambda fn: True)
             
     def get_options_from_report(self, data):
         options = data.get("options", False)
@@ -255,100 +381,124 @@ class Work(Process):
                 self.options.address = True
 
     def lock_fixme(self, filename):
-        fn = self._path("review.txt")
-        review = csv2dict(fn)
         taskname = filename.split(".")[0]
-        fixme = []
-        if taskname in review:
-            fixmes = review[taskname][0]
-            fixme = [
-                str(fixmes),
+        try:
+            fixme = fixmes.lock(
+                self.path,
+                taskname,
                 g.user_data["osm_id"],
                 g.user_data["username"],
-                str(time.time()),
-            ]
-            review[taskname] = fixme
-            dict2csv(fn, review)
-        return self._get_fixme_dict(taskname, fixme)
+            )
+        except fixmes.Locked as e:
+            abort(409, message=f"Tarea bloqueada por {e.fields[2]}")
+        return self._get_fixme_dict(taskname, fixme or [])
 
     def unlock_fixme(self, filename):
-        fn = self._path("review.txt")
-        review = csv2dict(fn)
-        review_bck = csv2dict(self._path("backup", "review.txt"))
         taskname = filename.split(".")[0]
         fixme = []
-        if taskname in review:
+        if fixmes.get(self.path, taskname):
+            review_bck = csv2dict(self._path("backup", "review.txt"))
             src = self._path('backup', taskname + '.osm.gz')
             dst = self._path(self.target_dir, self.tasks_dir, taskname + '.osm.gz')
             shutil.copy(src, dst)
-            fixmes = review_bck[taskname][0]
-            fixme = [str(fixmes)]
-            review[taskname] = fixme
-            dict2csv(fn, review)
+            fixme = fixmes.update(
+                self.path, taskname, [str(review_bck[taskname][0])]
+            ) or []
         return self._get_fixme_dict(taskname, fixme)
 
     def save_fixme(self, file):
-        tmpfo, tmpfn = mkstemp()
-        file.save(tmpfn)
+        tmpfo, tmpfn = mkstemp(dir=self.path, suffix=".tmp")
+        os.close(tmpfo)
         try:
+            file.save(tmpfn)
             with gzip.open(tmpfn) as fo:
-                data = osmxml.deserialize(fo)
-                comment = data.tags.get("comment", "")
-                match = re.search(" ([0-9A-Z]{14})$", comment)
-                if match:
-                    filename = match.group(1) + ".osm.gz"
-                else:
-                    filename = secure_filename(file.filename)
-        except (gzip.BadGzipFile, osmxml.etree.Error) as e:
-            return "notvalid"
-        fn = self._path("review.txt")
-        review = csv2dict(fn)
-        taskname = filename.split(".")[0]
-        if filename.endswith(".gz") and taskname in review:
+                comment, count = fixmes.scan(fo)
+            match = re.search(" ([0-9A-Z]{14})$", comment)
+            if match:
+                filename = match.group(1) + ".osm.gz"
+            else:
+                filename = secure_filename(file.filename)
+            taskname = filename.split(".")[0]
+            if not (filename.endswith(".gz") and fixmes.get(self.path, taskname)):
+                return "notfound"
             target = self._path(self.target_dir, self.tasks_dir, filename)
-            shutil.copyfile(tmpfn, target)
-            os.remove(tmpfn)
-            fixmes = 0
-            for el in data.elements:
-                if "fixme" in el.tags:
-                    fixmes += 1
-            fixme = [str(fixmes), g.user_data["osm_id"], g.user_data["username"]]
-            review[taskname] = fixme
-            dict2csv(fn, review)
-            return self._get_fixme_dict(taskname, fixme)
-        os.remove(tmpfn)
-        return "notfound"
+            os.chmod(tmpfn, 0o644)
+            os.replace(tmpfn, target)
+        except (gzip.BadGzipFile, EOFError, fixmes.NotValid):
+            return "notvalid"
+        finally:
+            if os.path.exists(tmpfn):
+                os.remove(tmpfn)
+        fixme = [str(count), g.user_data["osm_id"], g.user_data["username"]]
+        fixmes.update(self.path, taskname, fixme)
+        return self._get_fixme_dict(taskname, fixme)
 
     def clear_fixmes(self):
         fp = self._path("review.txt")
         target = self._path(self.target_dir, self.tasks_dir, "review.txt")
-        review = csv2dict(fp)
-        if sum([int(fixme[0]) for fixme in review.values()]) == 0:
+        review = fixmes.rows(self.path)
+        if sum([int(fixme[1][0]) for fixme in review]) == 0:
+            fixmes.export(self.path)
             shutil.move(fp, target)
             self.linea = 0
+            self._refresh()
 
     def export(self):
         if self._path_exists(self.target_dir, self.tasks_dir):
-            tasks = "/".join([self.mun_code, self.target_dir, self.tasks_dir])
-            tmpfo, tmpfn = mkstemp()
-            return shutil.make_archive(tmpfn, "zip", WORK_DIR, tasks)
+            tasks = os.path.join(self.mun_code, self.target_dir, self.tasks_dir)
+            return exports.archive(WORK_DIR, tasks)
+
+    def export_stream(self):
+        if self._path_exists(self.target_dir, self.tasks_dir):
+            tasks = os.path.join(self.mun_code, self.target_dir, self.tasks_dir)
+            return exports.stream(WORK_DIR, tasks), exports.etag(WORK_DIR, tasks)
+
+    def _emit(self, event, value):
+        if self.events:
+            self.events.send((event, value))
 
     def watch_log(self, user_data):
-        data = dict(user_data)
-        while self.status != Work.Status.RUNNING:
-            pass
-        while self.status == Work.Status.RUNNING:
-            data["job"] = self.get_dict()
-            log = data["job"]["log"]
-            if len(log) > 0:
-                self.socketio.emit("updateJob", data, to=self.mun_code)
-            self.socketio.sleep(0.5)
-        data["job"] = self.get_dict()
-        log = data["job"]["log"]
-        if len(log) > 0:
-            self.socketio.emit("updateJob", data, to=self.mun_code)
-        if self.status == Work.Status.DONE:
-            self.socketio.emit("done", data, to=self.mun_code)
+        async_mode = self.socketio.server.eio.async_mode
+        self.linea = 0
+        stats = None
+        for batch in events.receive(self.events, async_mode):
+            job = {
+                "cod_municipio": self.mun_code,
+                "cod_division": self.split or "",
+                "log": [],
+            }
+            for event, value in batch:
+                if event == "log":
+                    job["log"] += value
+                elif event == "status":
+                    job["estado"] = value
+                elif event == "end":
+                    stats = value
+            if job["log"] and self.first_log is None:
+                self.first_log = time.time()
+            if not job["log"] and "estado" not in job:
+                continue
+            self.linea += len(job["log"])
+            job["linea"] = self.linea
+            self.socketio.emit(
+                "updateJob", dict(user_data, job=job), to=self.mun_code
+            )
+        if stats is None:
+            self.fail("El proceso de trabajo terminó inesperadamente")
+        self.linea = 0
+        # El informe y el estado han cambiado durante el proceso
+        self._refresh()
+        self._options = None
+        data = dict(user_data, job=self.get_dict())
+        self.socketio.emit("done", data, to=self.mun_code)
+        return stats
+
+    def fail(self, msg):
+        """Marca con error un proceso que no ha podido terminar."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._path("catatom2osm.log"), "a") as fo:
+            fo.write(f"ERROR - {msg}\n")
+        self._refresh()
 
     @property
     def current_args(self):
@@ -385,53 +535,83 @@ class Work(Process):
         return type
 
     def run(self):
+        """Ejecuta catatom2osm y devuelve la duración de cada fase."""
+        watch = metrics.Stopwatch()
+        addressindex.remove(self.path)
+        highwaynames.export(self.path)
+        fixmes.export(self.path)
         self._path_remove("report.txt")
         if not (self.options.address and self._path_exists("highway_names.csv")):
             self._path_remove("report.json")
+        watch.lap("prepare")
         self._read_cache()
+        watch.lap("cache")
         socketio_logger = logging.getLogger("socketio.server")
         log = cat_config.setup_logger(log_path=self.path)
+        file_handler = next(
+            (h for h in log.handlers if isinstance(h, logging.FileHandler)), None
+        )
         log.handlers += socketio_logger.handlers
+        if self.events:
+            formatter = file_handler.formatter if file_handler else None
+            log.addHandler(events.PipeHandler(self.events, formatter))
         log.setLevel(logging.INFO)
         log.app_level = logging.INFO
+        default_config = {k: getattr(cat_config, k, None) for k in self.config}
         cat_config.set_config(self.config)
         with open(self._path("user.json"), "w") as fo:
             json.dump(self.user, fo)
+        self._refresh()
+        self._emit("status", self.status.name)
+        watch.lap("prepare")
+        # El proceso de trabajo se reutiliza: se vuelve a su carpeta
+        cwd = os.getcwd()
         try:
-            qgs = QgsSingleton()
             os.chdir(self.path)
             CatAtom2Osm.create_and_run(self.path, self.options)
-            qgs.exitQgis()
         except Exception as e:
             msg = e.message if getattr(e, "message", "") else str(e)
             log.error(msg)
+        finally:
+            os.chdir(cwd)
+        watch.lap("catatom2osm")
+        # El proceso que ejecuta el trabajo se reutiliza para los siguientes
+        cat_config.set_config(default_config)
+        for handler in list(log.handlers):
+            if isinstance(handler, (logging.FileHandler, events.PipeHandler)):
+                handler.close()
+            log.removeHandler(handler)
         self._backup_files()
+        watch.lap("backup")
+        jobindex.refresh(self.mun_code)
         if self.status in [Work.Status.DONE, Work.Status.FIXME]:
             src = self._path("catatom2osm.log")
             dst = self._path(self.target_dir, self.tasks_dir, "catatom2osm.log")
             shutil.move(src, dst)
+        self._refresh()
+        if self.status == Work.Status.REVIEW:
+            addressindex.build(self.path)
+        self._emit("status", self.status.name)
+        return watch.lap("index")
 
     @property
     def status(self):
-        if self._path_exists() and self._path_exists("user.json"):
-            log, __ = self.log()
-            if log and "ERROR" in log[-1]:
-                return Work.Status.ERROR
-            if self._path_exists("report.txt"):
-                if self._path_exists("highway_names.csv"):
-                    return Work.Status.REVIEW
-                if self._path_exists("review.txt"):
-                    return Work.Status.FIXME
-                fp = self._path(self.target_dir, self.tasks_dir)
-                if self._path_exists(self.target_dir, self.tasks_dir):
-                    return Work.Status.DONE
-                else:
-                    return Work.Status.AVAILABLE
-            return Work.Status.RUNNING
-        else:
-            return Work.Status.AVAILABLE
-
-    def get_dict(self, msg=""):
+        if jobqueue.position(self.mun_code):
+            return Work.Status.QUEUED
+        name = jobindex.status(self.mun_code, self.target_dir, self.tasks_dir)
+        return Work.Status[name]
+
+    @staticmethod
+    def _version(value):
+        data = json.dumps(value, sort_keys=True).encode()
+        return hashlib.sha1(data).hexdigest()[:12]
+
+    def get_dict(self, msg="", versions=None):
+        """Estado completo del proceso.
+
+        versions es {sección: versión} con lo que ya tiene el cliente; las
+        secciones que no han cambiado se omiten de la respuesta.
+        """
         data = {
             "cod_municipio": self.mun_code,
             "propietario": Work.get_user(self.mun_code),
@@ -447,6 +627,8 @@ class Work(Process):
         data["cod_division"] = self.split or ""
         status = self.status
         data["estado"] = status.name
+        if status == Work.Status.QUEUED:
+            data["posicion"] = jobqueue.position(self.mun_code)
         data["type"] = self.type
         data["log"], self.linea = self.log(self.linea)
         data["current_args"] = self.current_args
@@ -456,10 +638,14 @@ class Work(Process):
             data["callejero"] = self.highway_names
         if status == Work.Status.FIXME or status == Work.Status.DONE:
             data["revisar"] = self.review
-        if status != Work.Status.RUNNING:
-            data["charla"] = self.chat
         if status == Work.Status.AVAILABLE:
             data["info"] = self.info
+        data["versiones"] = {
+            k: Work._version(data[k]) for k in SECTIONS if k in data
+        }
+        for k, version in data["versiones"].items():
+            if versions and versions.get(k) == version:
+                del data[k]
         return data
 
     def log(self, linea = 0):
@@ -470,48 +656,41 @@ class Work(Process):
 
     def get_highway_name(self, street):
         if self._path_exists("address.geojson"):
+            if street:
+                return addressindex.lookup(self.path, street) or {}
             with open(self._path("address.geojson"), "r") as fo:
                 data = json.load(fo)
-            if street:
-                filtered = [
-                    feat for feat in data['features']
-                    if feat['properties']['TN_text'] == street
-                ]
-                data['features'] = filtered
             return data
         return {}
 
     def undo_highway_name(self, data):
         if self._path_exists("highway_names.csv"):
-            fn = self._path("highway_names.csv")
-            hgwnames = csv2dict(fn)
             hgwnames_bck = csv2dict(self._path("backup", "highway_names.csv"))
             cat = data["cat"]
-            conv = data["conv"]
-            hgwnames[cat] = hgwnames_bck[cat]
-            data["conv"] = hgwnames[cat][0]
-            data["src"] = hgwnames[cat][1]
-            dict2csv(fn, hgwnames)
+            highwaynames.put(self.path, cat, hgwnames_bck[cat])
+            data["conv"] = hgwnames_bck[cat][0]
+            data["src"] = hgwnames_bck[cat][1]
         return data
-        
 
     def update_highway_name(self, data):
         if self._path_exists("highway_names.csv"):
-            fn = self._path("highway_names.csv")
-            hgwnames = csv2dict(fn)
             cat = data["cat"]
             conv = data["conv"]
-            if cat in hgwnames:
-                user = getattr(g, "user_data", "")
-                data["src"] = hgwnames[cat][1]
+            user = getattr(g, "user_data", "")
+
+            def edit(fields):
+                data["src"] = fields[1]
                 data["osm_id"] = user["osm_id"]
                 data["username"] = user["username"]
-                hgwnames[cat] = [conv, data["src"], user["osm_id"], user["username"]]
-                dict2csv(fn, hgwnames)
+                return [conv, data["src"], user["osm_id"], user["username"]]
+
+            highwaynames.update(self.path, cat, edit)
         return data
 
     @property
     def highway_names(self):
+        if not self.report_path and self._path_exists("highway_names.csv"):
+            return highwaynames.rows(self.path)
         highway_names = self._get_file(self.report_path or "", "highway_names.csv")[0]
         if not highway_names:
             tasks = "tasks-d" if self.type else "tasks"
@@ -529,12 +708,12 @@ class Work(Process):
             tasks = "tasks-" + self.type[:1] if self.type else "tasks"
             fp = self._path(self.target_dir, tasks, fn)
         report = self.get_report_json(fp)
-        self.report_path = False
+        self._report_path = False
         fp = os.path.relpath(os.path.dirname(fp), self.path)
         if report:
-            self.report_path = "" if fp == "." else fp
-        if not self.split:
-            self.split = report.get("split_id", None)
+            self._report_path = "" if fp == "." else fp
+        if not self._split:
+            self._split = report.get("split_id", None)
         return report
 
     def get_report_json(self, fp):
@@ -554,6 +733,11 @@ class Work(Process):
     def review(self):
         review = []
         fp = self._path(self.report_path or "", "review.txt")
+        if not self.report_path and os.path.exists(fp):
+            return [
+                self._get_fixme_dict(k, v, active)
+                for k, v, active in fixmes.rows(self.path)
+            ]
         if not os.path.exists(fp):
             tasks = "tasks-b" if self.type else "tasks"
             fp = self._path(self.target_dir, tasks, "review.txt")
@@ -578,13 +762,15 @@ class Work(Process):
     def _recover(self):
         report = []
         cwd = os.getcwd()
-        if self._path_exists(self.target_dir):
-            os.chdir(self._path(self.target_dir))
-            report = glob.glob("**/report.txt", recursive=True)
-        if not report:
-            os.chdir(self.path)
-            report = glob.glob("**/report.txt", recursive=True)
-        os.chdir(cwd)
+        try:
+            if self._path_exists(self.target_dir):
+                os.chdir(self._path(self.target_dir))
+                report = glob.glob("**/report.txt", recursive=True)
+            if not report:
+                os.chdir(self.path)
+                report = glob.glob("**/report.txt", recursive=True)
+        finally:
+            os.chdir(cwd)
         if report:
             fp = os.path.dirname(report[0])
             source = self._path(self.target_dir if fp.startswith("tasks") else "", fp)
@@ -598,6 +784,10 @@ class Work(Process):
                     shutil.copy(self._path(source, fn), self.path)
 
     def delete(self):
+        addressindex.remove(self.path)
+        highwaynames.remove(self.path)
+        fixmes.remove(self.path)
+        exports.remove(os.path.join(self.mun_code, self.target_dir, self.tasks_dir))
         self._clean_root()
         self._path_remove("backup")
         self._path_remove(self.target_dir, self.tasks_dir)
@@ -607,19 +797,7 @@ class Work(Process):
         self._recover()
         if not self._path_exists("report.txt"):
             self._path_remove("user.json")
-
-    def _splits(self):
-        divisiones = [
-            {
-                "osm_id": district[1],
-                "nombre": f"{'  ' if district[0] else ''}{district[2]} {district[3]}",
-                "estado": Work(self.mun_code, district[1]).status.name,
-            } 
-            for district in get_districts(self.mun_code)
-        ]
-        with open(self._path("splits.json"), "w") as fo:
-            json.dump(divisiones, fo)
-        return divisiones
+        self._refresh()
 
     @property
     def splits(self):
@@ -627,25 +805,41 @@ class Work(Process):
         fp = os.path.join(CACHE_DIR, self.mun_code, "splits.json")
         if not self._path_exists("splits.json") and os.path.exists(fp):
             shutil.copy(fp, self.path)
-        if self._path_exists("splits.json"):
-            with open(self._path("splits.json"), "r") as fo:
-                divisiones = json.load(fo)
-            p = Process(target=self._splits)
-            p.start()
-        else:
-            divisiones = self._splits()
+        divisiones = [
+            dict(split, estado=Work.get_status(self.mun_code, split["osm_id"]).name)
+            for split in splits.get(self.mun_code, self._path("splits.json"))
+        ]
         return {
             "cod_municipio": self.mun_code,
             "divisiones": divisiones,
         }
 
-    @property
-    def chat(self):
-        chat = []
-        if self._path_exists("chat.json"):
-            with open(self._path("chat.json"), "r") as fo:
-                chat = json.load(fo)
-        return chat
+    def chat(self, offset=None, limit=chatlog.PAGE_SIZE):
+        """Página de mensajes del chat y número total de mensajes."""
+        return chatlog.read(self.path, offset, limit)
+
+    def fetch_info(self):
+        """Genera con catatom2osm el resumen del municipio en la caché.
+
+        Las descargas que necesite se enlazan desde el almacén y se eliminan
+        de la caché al terminar. Devuelve la duración como en run.
+        """
+        watch = metrics.Stopwatch()
+        cache = os.path.join(CACHE_DIR, self.mun_code)
+        os.makedirs(cache, exist_ok=True)
+        datasets.seed(self.mun_code, cache)
+        options = argparse.Namespace(**vars(self.options))
+        options.info = True
+        cwd = os.getcwd()
+        try:
+            os.chdir(cache)
+            CatAtom2Osm.create_and_run(cache, options)
+        finally:
+            os.chdir(cwd)
+            # Solo hace falta info.json: no se guardan en el almacén
+            for fp in glob.iglob(os.path.join(cache, workspace.DATASET)):
+                os.remove(fp)
+        return watch.lap("info")
 
     @property
     def info(self):
@@ -658,7 +852,5 @@ class Work(Process):
         return info
 
     def add_message(self, msg):
-        chat = self.chat
-        chat.append(msg)
-        with open(self._path("chat.json"), "w") as fo:
-            json.dump(chat, fo)
+        msg["id"] = chatlog.append(self.path, msg)
+        return msg
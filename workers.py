@@ -0,0 +1,120 @@
+import logging
+import resource
+from multiprocessing import Pipe, Process
+
+import psutil
+
+from catatom2osm.app import QgsSingleton
+from work import Work
+
+
+log = logging.getLogger("socketio.server")
+
+
+def _reset_peak_rss():
+    """Reinicia el máximo de memoria residente del proceso (Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fo:
+            fo.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss():
+    """Máximo de memoria residente desde el último reinicio, en bytes."""
+    try:
+        with open("/proc/self/status") as fo:
+            for line in fo:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _main(conn, max_jobs, max_rss):
+    """Bucle del proceso: inicializa QGIS una vez y ejecuta trabajos."""
+    qgs = QgsSingleton()
+    jobs = 0
+    try:
+        while True:
+            try:
+                item = conn.recv()
+            except EOFError:
+                break
+            if item is None:
+                break
+            job = stages = None
+            _reset_peak_rss()
+            try:
+                job = Work(
+                    item["mun_code"], item["split"], item["user"], **item["args"]
+                )
+                job.events = conn
+                if item.get("action") == "info":
+                    stages = job.fetch_info()
+                else:
+                    stages = job.run()
+            except Exception as e:
+                log.exception(f"Error procesando {item['mun_code']}")
+                if job and item.get("action") != "info":
+                    job.fail(str(e))
+            jobs += 1
+            rss = psutil.Process().memory_info().rss
+            recycle = jobs >= max_jobs or rss > max_rss
+            stats = {
+                "jobs": jobs,
+                "rss": rss,
+                "peak_rss": _peak_rss(),
+                "stages": stages,
+                "recycle": recycle,
+            }
+            conn.send(("end", stats))
+            if recycle:
+                break
+    finally:
+        qgs.exitQgis()
+        conn.close()
+
+
+class Worker:
+    """Proceso de larga duración con QGIS inicializado.
+
+    Recibe descripciones de trabajo (procesar o, con action="info", obtener
+    el resumen del municipio) por una tubería y devuelve por ella los
+    eventos de cada trabajo, terminados con ("end", estadísticas). Se
+    recicla tras max_jobs trabajos o si su memoria residente supera max_rss
+    bytes.
+    """
+
+    def __init__(self, max_jobs, max_rss):
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=_main, args=(child_conn, max_jobs, max_rss))
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def send(self, mun_code, split, user, args, action="run"):
+        self.conn.send(
+            {
+                "mun_code": mun_code,
+                "split": split,
+                "user": user,
+                "args": args,
+                "action": action,
+            }
+        )
+
+    def stop(self, socketio):
+        """Termina el proceso sin bloquear el bucle de eventos."""
+        if self.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        while self.is_alive():
+            socketio.sleep(0.1)
+        self.process.join()
+        self.conn.close()
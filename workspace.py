@@ -0,0 +1,103 @@
+import errno
+import fcntl
+import fnmatch
+import os
+import shutil
+from tempfile import mkstemp
+
+
+FICLONE = 0x40049409  # ioctl de Linux para clonar un archivo (reflink)
+NO_CLONE = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.EBADF}
+
+DATASET = "A.ES.SDGC.??.?????.zip"
+
+stats = {"skipped": 0, "linked": 0, "cloned": 0, "copied": 0, "bytes": 0}
+
+
+def is_dataset(fn):
+    """Las descargas del Catastro no se modifican nunca: se pueden enlazar."""
+    return fnmatch.fnmatch(fn, DATASET)
+
+
+def _same(src, dst):
+    """Indica si dst ya tiene el contenido de src."""
+    try:
+        a = os.stat(src)
+        b = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    if (a.st_dev, a.st_ino) == (b.st_dev, b.st_ino):
+        return True
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+
+def _clone(src, dst):
+    """Copia src en dst compartiendo bloques si el sistema de archivos lo
+    permite. Devuelve False si no es posible."""
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        try:
+            fcntl.ioctl(fo.fileno(), FICLONE, fi.fileno())
+        except OSError as e:
+            if e.errno in NO_CLONE:
+                return False
+            raise
+    shutil.copystat(src, dst)
+    return True
+
+
+def place(src, dst, link=False):
+    """Pone en dst el contenido de src escribiendo lo mínimo.
+
+    No hace nada si dst ya es igual (mismo tamaño y fecha). Con link=True
+    usa un enlace duro, solo apto para archivos que nunca se modifican
+    (las descargas del Catastro). Si no, intenta un reflink y, si el
+    sistema de archivos no lo admite, copia conservando la fecha.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if _same(src, dst):
+        stats["skipped"] += 1
+        return dst
+    # Nombre temporal único: dos procesos pueden colocar el mismo archivo
+    # a la vez y dst puede estar enlazado desde otras carpetas
+    fd, tmp = mkstemp(dir=os.path.dirname(dst), suffix=".tmp")
+    os.close(fd)
+    try:
+        if link:
+            os.remove(tmp)
+            try:
+                os.link(src, tmp)
+                os.replace(tmp, dst)
+                stats["linked"] += 1
+                return dst
+            except OSError:
+                pass
+        if _clone(src, tmp):
+            stats["cloned"] += 1
+        else:
+            shutil.copy2(src, tmp)
+            stats["copied"] += 1
+            stats["bytes"] += os.path.getsize(tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return dst
+
+
+def place_tree(src, dst, link=None):
+    """Como shutil.copytree(src, dst, dirs_exist_ok=True) usando place.
+
+    link es una función que indica si un nombre de archivo se puede
+    enlazar.
+    """
+    for dirpath, dirnames, filenames in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(dirpath, src))
+        os.makedirs(target, exist_ok=True)
+        for fn in filenames:
+            place(
+                os.path.join(dirpath, fn),
+                os.path.join(target, fn),
+                bool(link and link(fn)),
+            )
+    return dst